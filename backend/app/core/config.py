@@ -41,6 +41,19 @@ class Settings(BaseSettings):
     
     # Search settings
     DEFAULT_TOP_K: int = 200
+    WARMUP_ON_STARTUP: bool = True  # Run one dummy query through every search service at startup
+    EMBEDDING_CACHE_SIZE: int = 4096  # Query embeddings kept in memory (all models, per worker)
+    EMBEDDING_CACHE_DIR: Optional[str] = None  # Persistent embedding cache shared by workers (disabled if unset)
+    EMBEDDING_FANOUT_WORKERS: int = 16  # Max concurrent per-text requests to embedding servers (per worker)
+    EMBEDDING_HTTP2: bool = False  # Talk HTTP/2 (httpx) to embedding servers: concurrent calls share one connection
+    IC_QUERY_CACHE_SIZE: int = 1024  # Max cached IC (Qwen + Qdrant + Cohere rerank) results
+    IC_QUERY_CACHE_TTL: int = 300  # Seconds before a cached IC result expires
+    SEARCH_ENSEMBLE_WEIGHT_CLIP: float = 0.25  # Multimodel ensemble weight (0 = model not queried)
+    SEARCH_ENSEMBLE_WEIGHT_BEIT3: float = 0.50
+    SEARCH_ENSEMBLE_WEIGHT_BIGG: float = 0.25
+    SEARCH_SEMANTIC_CACHE_THRESHOLD: float = 0.0  # Reuse ensemble results for queries with query-embedding cosine >= this (0 = off, e.g. 0.95)
+    SEARCH_SEMANTIC_CACHE_SIZE: int = 1024  # Max cached ensemble results (semantic cache)
+    SEARCH_SEMANTIC_CACHE_TTL: int = 300  # Seconds before a semantic cache entry expires
     
     EMBEDDING_SERVER_QWEN: Optional[List[str]] = None
     COHERE_API_KEYS: Optional[List[str]] = None
@@ -59,6 +72,12 @@ class Settings(BaseSettings):
     ELASTICSEARCH_USE_SSL: bool = False
     ELASTICSEARCH_VERIFY_CERTS: bool = True
     ELASTICSEARCH_WAIT_TIMEOUT: int = 30  # Timeout in seconds for waiting Elasticsearch to be ready
+    ELASTICSEARCH_CONNECTIONS_PER_NODE: int = 32  # HTTP keep-alive pool size per node (>= search threads)
+    ELASTICSEARCH_QUERY_CACHE_SIZE: int = 10000  # Max cached ASR/OCR query results
+    ELASTICSEARCH_QUERY_CACHE_TTL: int = 300  # Seconds before a cached ASR/OCR result expires
+    ELASTICSEARCH_OBJECT_INDEX_REFRESH: int = 600  # Seconds between background rebuilds of the in-memory object index (0 = query ES)
+    ELASTICSEARCH_BULK_THREADS: int = 8  # Worker threads for parallel bulk ingestion
+    ELASTICSEARCH_BULK_MAX_BYTES: int = 10 * 1024 * 1024  # Max payload per bulk request (ES recommends 5-15MB)
     
     # Qdrant settings (gRPC only)
     QDRANT_HOST: str = "localhost"
@@ -70,6 +89,12 @@ class Settings(BaseSettings):
     QDRANT_RETRY_ATTEMPTS: int = 5  # Number of retry attempts for connection
     QDRANT_RETRY_DELAY: int = 3  # Delay in seconds between retry attempts
     QDRANT_BATCH_SIZE: int = 500  # Batch size for vector ingestion (larger = faster)
+    QDRANT_UPLOAD_WORKERS: Optional[int] = None  # Upload processes for ingestion (None = half the CPU cores)
+    QDRANT_INGEST_WORKERS: int = 2  # Collections (.bin files) ingested concurrently, each in its own process
+    QDRANT_HNSW_EF: Optional[int] = 128  # HNSW ef at search time (recall/latency trade-off), 0/None = server default
+    QDRANT_SCALAR_QUANTIZATION: bool = True  # int8 scalar quantization (kept in RAM) for new collections, rescored with the original vectors
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = 2.0  # Candidates per result taken from the int8 index before rescoring
+    QDRANT_VECTORS_ON_DISK: bool = False  # Keep the original vectors of new collections on disk (RAM holds only the int8 copies)
     VECTOR_SIZE: Optional[int] = None  # Vector size (dimensions). If None, will auto-detect from .bin files
     
     # Logging
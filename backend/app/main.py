@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 
@@ -28,9 +29,18 @@ async def lifespan(app: FastAPI):
             app_logger.error(f"❌ Failed to initialize chatbox database: {e}")
             # Continue startup even if database init fails (optional feature)
     
+    # Warm up embedding servers, Qdrant and Elasticsearch before first query
+    if settings.WARMUP_ON_STARTUP:
+        from app.utils.warmup import warmup_search_services
+        await asyncio.get_running_loop().run_in_executor(None, warmup_search_services)
+    
     yield
     # Shutdown
     app_logger.info("🛑 Shutting down FastAPI application...")
+    from app.routers.search_image import close_http_client
+    await close_http_client()
+    from app.services.method.multimodel_search import close_multimodel_search
+    close_multimodel_search()
 
 
 app = FastAPI(
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List
+from typing import Any, Dict, List
 import json
+import orjson
 import time
+from functools import lru_cache
 from pathlib import Path
-from collections import defaultdict
 import logging
 
 from app.core.config import settings
@@ -14,6 +15,7 @@ from app.services.method.asr_ocr import get_asr_ocr_search
 from app.services.method.ic_search import get_ic_search
 from app.utils.mapping import load_mapping_kf, load_mapping_scene
 from app.services.method.object_filter import ObjectFilterSearch
+from app.utils.ensemble import ensemble_weighted_sum, ensemble_z_scores
 from app.utils.scale import ScoreScaler
 from app.utils.translator import get_translator
 
@@ -33,50 +35,23 @@ def _load_json(path: Path) -> Dict[str, Any]:
     if not path.exists():
         raise HTTPException(status_code=404, detail=f"File not found: {path}")
     try:
-        return json.loads(path.read_text(encoding="utf-8"))
+        return _parse_json_file(str(path), path.stat().st_mtime_ns)
     except json.JSONDecodeError as exc:
         raise HTTPException(status_code=500, detail=f"Failed to parse JSON from {path}: {exc}")
 
 
+@lru_cache(maxsize=8)
+def _parse_json_file(path: str, mtime_ns: int) -> Dict[str, Any]:
+    # Keyed by mtime: re-parsed only when the file changes on disk
+    return orjson.loads(Path(path).read_bytes())
+
+
 def _ensemble_multimodal_results(clip_res, beit3_res, bigg_res, top_k):
     """
     Ensemble CLIP, BEiT3, BIGG results with z-score normalization.
     Returns list of results with ensembled scores.
     """
-    clip_z = ScoreScaler.z_score_normalize([r["score"] for r in clip_res])
-    beit3_z = ScoreScaler.z_score_normalize([r["score"] for r in beit3_res])
-    bigg_z = ScoreScaler.z_score_normalize([r["score"] for r in bigg_res])
-
-    # Weights for multimodal ensemble
-    clip_weight = 0.25
-    beit3_weight = 0.50
-    bigg_weight = 0.25
-
-    ensemble = defaultdict(float)
-    meta = {}
-
-    def accumulate(res, zlist, w):
-        for r, z in zip(res, zlist):
-            rid = r["id"]
-            ensemble[rid] += z * w
-            if rid not in meta:
-                meta[rid] = r
-
-    accumulate(clip_res, clip_z, clip_weight)
-    accumulate(beit3_res, beit3_z, beit3_weight)
-    accumulate(bigg_res, bigg_z, bigg_weight)
-
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    final_scores = ScoreScaler.min_max_scale([s for _, s in ranked])
-
-    results = []
-    for (rid, _), s in zip(ranked, final_scores):
-        item = meta.get(rid, {}).copy()
-        item["score"] = s
-        item["id"] = rid
-        results.append(item)
-
-    return results
+    return ensemble_z_scores([clip_res, beit3_res, bigg_res], get_multimodel_search().ensemble_weights, top_k)
 
 
 def _ensemble_all_methods(method_results: Dict[str, List[Dict]], top_k: int):
@@ -85,39 +60,12 @@ def _ensemble_all_methods(method_results: Dict[str, List[Dict]], top_k: int):
     Each method's results should already be scaled to [0,1] range.
     We combine them directly without additional normalization to preserve rankings.
     """
-    ensemble = defaultdict(float)
-    meta = {}
-
-    # Equal weight for each method
     num_methods = len(method_results)
     if num_methods == 0:
         return []
 
-    weight_per_method = 1.0 / num_methods
-
-    for method_name, results in method_results.items():
-        if not results:
-            continue
-
-        # All scores are already scaled to [0,1], just weight them
-        for r in results:
-            rid = r["id"]
-            score = r["score"]  # Already scaled [0,1]
-            ensemble[rid] += score * weight_per_method
-            if rid not in meta:
-                meta[rid] = r
-
-    # Rank by combined scores (already in [0,1] range)
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
-    final_results = []
-    for rid, combined_score in ranked:
-        item = meta.get(rid, {}).copy()
-        item["score"] = combined_score  # Use combined score as-is
-        item["id"] = rid
-        final_results.append(item)
-
-    return final_results
+    # Equal weight for each method; all scores are already scaled to [0,1], just weight them
+    return ensemble_weighted_sum(list(method_results.values()), [1.0 / num_methods] * num_methods, top_k)
 
 
 @router.post("/search", response_model=SearchResponse)
@@ -196,25 +144,25 @@ async def search(request: SearchRequest):
             logger.info(f"[ENSEMBLE] ⚡ Running SINGLE-PASS multimodal search (no augmentation)")
             multimodel_search = get_multimodel_search()
             
-            # Get individual model results
-            clip_res = multimodel_search.search_single_model(query_text, "clip", top_k * 2)
-            beit3_res = multimodel_search.search_single_model(query_text, "beit3", top_k * 2)
-            bigg_res = multimodel_search.search_single_model(query_text, "bigg", top_k * 2)
+            # Get individual model results (the three models run concurrently)
+            clip_res, beit3_res, bigg_res = multimodel_search.search_all_models(query_text, top_k * 2)
             
-            # Log sub-method results
-            clip_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in clip_res[:10]])
-            beit3_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in beit3_res[:10]])
-            bigg_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in bigg_res[:10]])
-            logger.info(f"[ENSEMBLE] CLIP top results: {clip_top}")
-            logger.info(f"[ENSEMBLE] BEiT3 top results: {beit3_top}")
-            logger.info(f"[ENSEMBLE] BIGG top results: {bigg_top}")
+            # Log sub-method results (the joins are skipped unless INFO is enabled)
+            if logger.isEnabledFor(logging.INFO):
+                clip_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in clip_res[:10]])
+                beit3_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in beit3_res[:10]])
+                bigg_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in bigg_res[:10]])
+                logger.info(f"[ENSEMBLE] CLIP top results: {clip_top}")
+                logger.info(f"[ENSEMBLE] BEiT3 top results: {beit3_top}")
+                logger.info(f"[ENSEMBLE] BIGG top results: {bigg_top}")
             
             # Ensemble the 3 multimodal sub-methods
             multimodal_ensemble = _ensemble_multimodal_results(clip_res, beit3_res, bigg_res, top_k)
             per_method_results["multimodal"] = multimodal_ensemble
             
-            multimodal_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in multimodal_ensemble[:10]])
-            logger.info(f"[ENSEMBLE] Multimodal ensemble top results: {multimodal_top}")
+            if logger.isEnabledFor(logging.INFO):
+                multimodal_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in multimodal_ensemble[:10]])
+                logger.info(f"[ENSEMBLE] Multimodal ensemble top results: {multimodal_top}")
             
             if mode == "A":
                 per_method_results["clip"] = clip_res[:top_k]
@@ -227,55 +175,55 @@ async def search(request: SearchRequest):
             ic_results = get_ic_search().search(query_text, top_k)
             
             # Scale Cohere rerank scores to [0, 1] using min-max normalization
-            if ic_results:
-                raw_scores = [r["score"] for r in ic_results]
-                scaled_scores = ScoreScaler.min_max_scale(raw_scores)
-                for r, scaled in zip(ic_results, scaled_scores):
-                    r["score"] = scaled
+            ScoreScaler.scale_results(ic_results, ScoreScaler.min_max_scale)
             
             per_method_results["ic"] = ic_results
-            ic_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in ic_results[:10]])
-            logger.info(f"[ENSEMBLE] IC top results (scaled): {ic_top}")
+            if logger.isEnabledFor(logging.INFO):
+                ic_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in ic_results[:10]])
+                logger.info(f"[ENSEMBLE] IC top results (scaled): {ic_top}")
+        
+        # ASR + OCR in a single Elasticsearch msearch when both are enabled
+        text_results = {}
+        if "asr" in enabled_methods and "ocr" in enabled_methods:
+            logger.info(f"[ENSEMBLE] Running ASR + OCR msearch")
+            text_results["asr"], text_results["ocr"] = get_asr_ocr_search().search_asr_and_ocr(
+                query_text, ocr_query_text, top_k
+            )
         
         # 3. Handle ASR search
         if "asr" in enabled_methods:
             logger.info(f"[ENSEMBLE] Running ASR search")
-            asr_results = get_asr_ocr_search().search_asr(query_text, top_k)
+            asr_results = text_results["asr"] if "asr" in text_results else get_asr_ocr_search().search_asr(query_text, top_k)
             
             # Scale BM25 scores using sigmoid scaling
-            if asr_results:
-                raw_scores = [r["score"] for r in asr_results]
-                scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-                for r, scaled in zip(asr_results, scaled_scores):
-                    r["score"] = scaled
+            ScoreScaler.scale_results(asr_results, ScoreScaler.bm25_scale)
             
             per_method_results["asr"] = asr_results
-            asr_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in asr_results[:10]])
-            logger.info(f"[ENSEMBLE] ASR top results (scaled): {asr_top}")
+            if logger.isEnabledFor(logging.INFO):
+                asr_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in asr_results[:10]])
+                logger.info(f"[ENSEMBLE] ASR top results (scaled): {asr_top}")
         
         # 4. Handle OCR search
         if "ocr" in enabled_methods:
             logger.info(f"[ENSEMBLE] Running OCR search with text: '{ocr_query_text}'")
-            ocr_results = get_asr_ocr_search().search_ocr(ocr_query_text, top_k)
+            ocr_results = text_results["ocr"] if "ocr" in text_results else get_asr_ocr_search().search_ocr(ocr_query_text, top_k)
             
             # Scale BM25 scores using sigmoid scaling
-            if ocr_results:
-                raw_scores = [r["score"] for r in ocr_results]
-                scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-                for r, scaled in zip(ocr_results, scaled_scores):
-                    r["score"] = scaled
+            ScoreScaler.scale_results(ocr_results, ScoreScaler.bm25_scale)
             
             per_method_results["ocr"] = ocr_results
-            ocr_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in ocr_results[:10]])
-            logger.info(f"[ENSEMBLE] OCR top results (scaled): {ocr_top}")
+            if logger.isEnabledFor(logging.INFO):
+                ocr_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in ocr_results[:10]])
+                logger.info(f"[ENSEMBLE] OCR top results (scaled): {ocr_top}")
 
         # 5. Ensemble all methods together if multiple methods enabled
         logger.info(f"[ENSEMBLE] Check: {len(enabled_methods)} enabled methods, per_method_results keys: {list(per_method_results.keys())}")
         if len(enabled_methods) > 1:
             logger.info(f"[ENSEMBLE] Ensembling {len(enabled_methods)} methods: {enabled_methods}")
             final_results = _ensemble_all_methods(per_method_results, top_k)
-            final_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in final_results[:20]])
-            logger.info(f"[ENSEMBLE] Final ensemble top results: {final_top}")
+            if logger.isEnabledFor(logging.INFO):
+                final_top = ', '.join([f"{r['id']}:{r['score']:.4f}" for r in final_results[:20]])
+                logger.info(f"[ENSEMBLE] Final ensemble top results: {final_top}")
         else:
             # Only one method enabled, use its results directly
             logger.info(f"[ENSEMBLE] Single method - using results directly from: {list(per_method_results.keys())}")
@@ -291,7 +239,8 @@ async def search(request: SearchRequest):
             obj_filter = ObjectFilterSearch()
             original_ids = [str(r["id"]) for r in final_results]
             filtered_ids = obj_filter.filter(original_ids, selected_objects)
-            final_results = [r for r in final_results if str(r["id"]) in filtered_ids]
+            filtered_id_set = set(filtered_ids)
+            final_results = [r for r in final_results if str(r["id"]) in filtered_id_set]
 
         # 7. Always return per_method_results for frontend flexibility
         # Frontend can switch between E/A/M modes without re-searching
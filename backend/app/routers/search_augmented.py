@@ -3,12 +3,11 @@ New search endpoint with query augmentation.
 This will replace the old search.py after testing.
 """
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import logging
 import time
-from collections import defaultdict
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from app.core.config import settings
 from app.logger.logger import log_search_query
@@ -18,6 +17,7 @@ from app.services.method.multimodel_search import get_multimodel_search
 from app.services.method.asr_ocr import get_asr_ocr_search
 from app.services.method.ic_search import get_ic_search
 from app.services.method.object_filter import ObjectFilterSearch
+from app.utils.ensemble import ensemble_weighted_sum, ensemble_z_scores
 from app.utils.scale import ScoreScaler
 from app.utils.translator import get_translator
 from app.services.gemini.query_augmentation import get_query_augmentor
@@ -31,11 +31,13 @@ router = APIRouter()
 _search_executor = ThreadPoolExecutor(max_workers=20)
 
 
-def _search_single_query(query_text: str, enabled_methods: set, top_k: int, ocr_text: str = None, object_filter_enabled: bool = False, selected_objects: List[str] = None):
+def _search_single_query(query_text: str, enabled_methods: set, top_k: int, ocr_text: str = None, object_filter_enabled: bool = False, selected_objects: List[str] = None, multimodal_batch: Optional[Tuple[List[Future], int]] = None):
     """
     Search with a single query across all enabled methods.
     Returns: dict with keys: ocr, multimodal, ic, asr (if enabled)
     Applies object filter to all methods if enabled.
+    multimodal_batch: (futures, index) from MultiModelSearch.submit_all_models_batch
+    covering this query, instead of running its own multimodal search.
     """
     results = {}
     
@@ -47,10 +49,12 @@ def _search_single_query(query_text: str, enabled_methods: set, top_k: int, ocr_
     
     # Multimodal search
     if "multimodal" in enabled_methods:
-        multimodel_search = get_multimodel_search()
-        clip_res = multimodel_search.search_single_model(query_text, "clip", top_k * 2)
-        beit3_res = multimodel_search.search_single_model(query_text, "beit3", top_k * 2)
-        bigg_res = multimodel_search.search_single_model(query_text, "bigg", top_k * 2)
+        if multimodal_batch is not None:
+            futures, idx = multimodal_batch
+            clip_res, beit3_res, bigg_res = (f.result()[idx] for f in futures)
+        else:
+            multimodel_search = get_multimodel_search()
+            clip_res, beit3_res, bigg_res = multimodel_search.search_all_models(query_text, top_k * 2)
         
         # Apply object filter to multimodal results
         if obj_filter:
@@ -76,42 +80,37 @@ def _search_single_query(query_text: str, enabled_methods: set, top_k: int, ocr_
             ic_results = _apply_object_filter(ic_results, obj_filter, selected_objects)
         
         # Scale IC scores
-        if ic_results:
-            raw_scores = [r["score"] for r in ic_results]
-            scaled_scores = ScoreScaler.min_max_scale(raw_scores)
-            for r, scaled in zip(ic_results, scaled_scores):
-                r["score"] = scaled
+        ScoreScaler.scale_results(ic_results, ScoreScaler.min_max_scale)
         results["ic"] = ic_results
     
+    # ASR + OCR in a single Elasticsearch msearch when both are enabled
+    ocr_query = ocr_text if ocr_text else query_text
+    text_results = {}
+    if "asr" in enabled_methods and "ocr" in enabled_methods:
+        text_results["asr"], text_results["ocr"] = get_asr_ocr_search().search_asr_and_ocr(
+            query_text, ocr_query, top_k
+        )
+    
     # ASR search (uses original Vietnamese if applicable)
     if "asr" in enabled_methods:
-        asr_results = get_asr_ocr_search().search_asr(query_text, top_k)
+        asr_results = text_results["asr"] if "asr" in text_results else get_asr_ocr_search().search_asr(query_text, top_k)
         
         # Apply object filter
         if obj_filter:
             asr_results = _apply_object_filter(asr_results, obj_filter, selected_objects)
         
-        if asr_results:
-            raw_scores = [r["score"] for r in asr_results]
-            scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-            for r, scaled in zip(asr_results, scaled_scores):
-                r["score"] = scaled
+        ScoreScaler.scale_results(asr_results, ScoreScaler.bm25_scale)
         results["asr"] = asr_results
     
     # OCR search
     if "ocr" in enabled_methods:
-        ocr_query = ocr_text if ocr_text else query_text
-        ocr_results = get_asr_ocr_search().search_ocr(ocr_query, top_k)
+        ocr_results = text_results["ocr"] if "ocr" in text_results else get_asr_ocr_search().search_ocr(ocr_query, top_k)
         
         # Apply object filter
         if obj_filter:
             ocr_results = _apply_object_filter(ocr_results, obj_filter, selected_objects)
         
-        if ocr_results:
-            raw_scores = [r["score"] for r in ocr_results]
-            scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-            for r, scaled in zip(ocr_results, scaled_scores):
-                r["score"] = scaled
+        ScoreScaler.scale_results(ocr_results, ScoreScaler.bm25_scale)
         results["ocr"] = ocr_results
     
     # Ensemble all methods for this query
@@ -122,7 +121,7 @@ def _search_single_query(query_text: str, enabled_methods: set, top_k: int, ocr_
     return results
 
 
-async def _search_single_query_async(query_text: str, enabled_methods: set, top_k: int, ocr_text: str = None, object_filter_enabled: bool = False, selected_objects: List[str] = None):
+async def _search_single_query_async(query_text: str, enabled_methods: set, top_k: int, ocr_text: str = None, object_filter_enabled: bool = False, selected_objects: List[str] = None, multimodal_batch: Optional[Tuple[List[Future], int]] = None):
     """Async wrapper for _search_single_query to enable parallel execution"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(
@@ -133,7 +132,8 @@ async def _search_single_query_async(query_text: str, enabled_methods: set, top_
         top_k,
         ocr_text,
         object_filter_enabled,
-        selected_objects
+        selected_objects,
+        multimodal_batch
     )
 
 
@@ -159,103 +159,21 @@ def _apply_object_filter(results: List, obj_filter: ObjectFilterSearch, selected
 
 def _ensemble_multimodal(clip_res, beit3_res, bigg_res, top_k):
     """Ensemble CLIP + BEiT3 + BIGG"""
-    clip_z = ScoreScaler.z_score_normalize([r["score"] for r in clip_res])
-    beit3_z = ScoreScaler.z_score_normalize([r["score"] for r in beit3_res])
-    bigg_z = ScoreScaler.z_score_normalize([r["score"] for r in bigg_res])
-    
-    ensemble = defaultdict(float)
-    meta = {}
-    
-    for r, z in zip(clip_res, clip_z):
-        ensemble[r["id"]] += z * 0.25
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    for r, z in zip(beit3_res, beit3_z):
-        ensemble[r["id"]] += z * 0.50
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    for r, z in zip(bigg_res, bigg_z):
-        ensemble[r["id"]] += z * 0.25
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    final_scores = ScoreScaler.min_max_scale([s for _, s in ranked])
-    
-    results = []
-    for (rid, _), s in zip(ranked, final_scores):
-        item = meta.get(rid, {}).copy()
-        item["score"] = s
-        item["id"] = rid
-        results.append(item)
-    
-    return results
+    return ensemble_z_scores([clip_res, beit3_res, bigg_res], get_multimodel_search().ensemble_weights, top_k)
 
 
 def _ensemble_methods(method_results: Dict[str, List], top_k: int):
     """Ensemble results from multiple methods (all scores already in [0,1])"""
-    ensemble = defaultdict(float)
-    meta = {}
-    
     num_methods = len(method_results)
     if num_methods == 0:
         return []
     
-    weight = 1.0 / num_methods
-    
-    for method_name, results in method_results.items():
-        if not results:
-            continue
-        for r in results:
-            rid = r["id"]
-            ensemble[rid] += r["score"] * weight
-            if rid not in meta:
-                meta[rid] = r
-    
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    
-    final_results = []
-    for rid, score in ranked:
-        item = meta.get(rid, {}).copy()
-        item["score"] = score
-        item["id"] = rid
-        final_results.append(item)
-    
-    return final_results
+    return ensemble_weighted_sum(list(method_results.values()), [1.0 / num_methods] * num_methods, top_k)
 
 
 def _ensemble_cross_queries(q0_results, q1_results, q2_results, top_k):
     """Ensemble results from Q0, Q1, Q2 for a specific method"""
-    ensemble = defaultdict(float)
-    meta = {}
-    
-    for r in q0_results:
-        ensemble[r["id"]] += r["score"] / 3.0
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    for r in q1_results:
-        ensemble[r["id"]] += r["score"] / 3.0
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    for r in q2_results:
-        ensemble[r["id"]] += r["score"] / 3.0
-        if r["id"] not in meta:
-            meta[r["id"]] = r
-    
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    
-    results = []
-    for rid, score in ranked:
-        item = meta.get(rid, {}).copy()
-        item["score"] = score
-        item["id"] = rid
-        results.append(item)
-    
-    return results
+    return ensemble_weighted_sum([q0_results, q1_results, q2_results], [1.0 / 3.0] * 3, top_k)
 
 
 @router.post("/search", response_model=AugmentedSearchResponse)
@@ -292,17 +210,15 @@ async def search_with_augmentation(request: SearchRequest):
         # Get original query
         query_text = request.query
         
-        # Translate Vietnamese to English if NOT using ASR
+        loop = asyncio.get_event_loop()
+        
+        # Translate Vietnamese to English if NOT using ASR (blocking HTTP call -> executor)
         if "asr" not in enabled_methods:
             translator = get_translator()
             if translator.is_vietnamese(query_text):
-                query_text = translator.translate(query_text)
+                query_text = await loop.run_in_executor(_search_executor, translator.translate, query_text)
                 logger.info(f"[TRANSLATE] '{request.query}' → '{query_text}'")
         
-        # Generate Q1, Q2 using Gemini
-        augmentor = get_query_augmentor()
-        q1_text, q2_text = augmentor.augment_query(query_text)
-        
         # Get OCR text if provided
         ocr_text = None
         if queries and "ocr" in enabled_methods:
@@ -321,14 +237,38 @@ async def search_with_augmentation(request: SearchRequest):
         if object_filter_enabled and selected_objects:
             logger.info(f"[AUGMENTED SEARCH] Object filter enabled: {selected_objects}")
         
-        # Search Q0, Q1, Q2 in PARALLEL (3x faster!)
+        # Q0 does not depend on Gemini -> start its search while Q1, Q2 are being generated
+        q0_task = asyncio.ensure_future(
+            _search_single_query_async(query_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects)
+        )
+        
+        # Generate Q1, Q2 using Gemini (blocking call -> executor, keeps the event loop free)
+        augmentor = get_query_augmentor()
+        try:
+            q1_text, q2_text = await loop.run_in_executor(_search_executor, augmentor.augment_query, query_text)
+        except BaseException:
+            q0_task.cancel()
+            raise
+        
+        # Search Q1, Q2 in PARALLEL with the already running Q0
         logger.info(f"[AUGMENTED SEARCH] 🚀 Running 3-PASS parallel search (Q0, Q1, Q2)")
         logger.info(f"[AUGMENTED SEARCH] Q0='{query_text}', Q1='{q1_text}', Q2='{q2_text}'")
         
+        # Q1 + Q2 multimodal: one batched embedding request and one Qdrant RPC per model for both
+        q12_multimodal = None
+        if "multimodal" in enabled_methods:
+            q12_multimodal = get_multimodel_search().submit_all_models_batch([q1_text, q2_text], top_k * 2)
+        
         q0_methods, q1_methods, q2_methods = await asyncio.gather(
-            _search_single_query_async(query_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects),
-            _search_single_query_async(q1_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects),
-            _search_single_query_async(q2_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects)
+            q0_task,
+            _search_single_query_async(
+                q1_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects,
+                (q12_multimodal, 0) if q12_multimodal else None
+            ),
+            _search_single_query_async(
+                q2_text, enabled_methods, top_k, ocr_text, object_filter_enabled, selected_objects,
+                (q12_multimodal, 1) if q12_multimodal else None
+            )
         )
         
         logger.info(f"[AUGMENTED SEARCH] Parallel search completed")
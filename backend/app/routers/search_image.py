@@ -2,11 +2,13 @@
 Image-based search endpoint
 Search for similar images using CLIP image embeddings
 """
+import logging
 import time
 import os
 import httpx
+import orjson
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from typing import List, Optional
 from app.core.config import settings
 from app.logger.logger import app_logger as logger
 from app.schemas.search_image import ImageSearchRequest, ImageSearchResponse
@@ -15,6 +17,26 @@ from app.utils.mapping import get_keyframe_path
 
 router = APIRouter()
 
+# One pooled client per worker: keep-alive connection (TLS to the ngrok tunnel) reused across searches
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+        )
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
 
 async def get_image_embedding(image_path: str) -> List[float]:
     """
@@ -50,16 +72,15 @@ async def get_image_embedding(image_path: str) -> List[float]:
     endpoint = f"{model_server_url}/embedding/clip/image"
     
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            with open(full_path, "rb") as f:
-                files = {"file": (os.path.basename(full_path), f, "image/webp")}
-                response = await client.post(endpoint, files=files)
-                response.raise_for_status()
-                
-                data = response.json()
-                embedding = data["embedding"]
-                logger.info(f"[IMAGE_SEARCH] Got embedding dimension: {len(embedding)}")
-                return embedding
+        with open(full_path, "rb") as f:
+            files = {"file": (os.path.basename(full_path), f, "image/webp")}
+            response = await get_http_client().post(endpoint, files=files)
+            response.raise_for_status()
+            
+            data = orjson.loads(response.content)
+            embedding = data["embedding"]
+            logger.info(f"[IMAGE_SEARCH] Got embedding dimension: {len(embedding)}")
+            return embedding
                 
     except httpx.HTTPError as e:
         logger.error(f"[IMAGE_SEARCH] Failed to get embedding from model server: {e}")
@@ -100,6 +121,7 @@ async def search_by_image(request: ImageSearchRequest):
         
         # 3. Format results (search_results is already formatted by wrapper)
         results = []
+        log_hits = logger.isEnabledFor(logging.INFO)
         for i, hit in enumerate(search_results):
             payload = hit.get("payload", {})
             result_id = hit.get("id", "")
@@ -107,7 +129,7 @@ async def search_by_image(request: ImageSearchRequest):
             # Get keyframe_path from mapping using ID (same as text search)
             keyframe_path = get_keyframe_path(result_id)
             
-            if i < 3:  # Log first 3 results for debugging
+            if log_hits and i < 3:  # Log first 3 results for debugging
                 logger.info(f"[IMAGE_SEARCH] Result #{i}: ID={result_id}, Path={keyframe_path}, Score={hit.get('score', 0)}")
             
             results.append({
@@ -121,7 +143,7 @@ async def search_by_image(request: ImageSearchRequest):
         search_time_ms = (time.time() - start_time) * 1000
         
         logger.info(f"[IMAGE_SEARCH] Found {len(results)} similar images in {search_time_ms:.2f}ms")
-        if results:
+        if results and log_hits:
             logger.info(f"[IMAGE_SEARCH] First result sample: {results[0]}")
         
         return ImageSearchResponse(
@@ -168,14 +190,13 @@ async def search_by_image_upload(
         # Read file content
         contents = await file.read()
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            files = {"file": (file.filename, contents, file.content_type)}
-            response = await client.post(endpoint, files=files)
-            response.raise_for_status()
-            
-            data = response.json()
-            embedding = data["embedding"]
-            logger.info(f"[IMAGE_SEARCH] Got embedding dimension: {len(embedding)}")
+        files = {"file": (file.filename, contents, file.content_type)}
+        response = await get_http_client().post(endpoint, files=files)
+        response.raise_for_status()
+        
+        data = orjson.loads(response.content)
+        embedding = data["embedding"]
+        logger.info(f"[IMAGE_SEARCH] Got embedding dimension: {len(embedding)}")
         
         # 2. Search in Qdrant
         qdrant = get_qdrant_client()
@@ -1,10 +1,9 @@
 from fastapi import APIRouter, HTTPException
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import time
 import logging
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from app.core.config import settings
 from app.logger.logger import log_search_query
@@ -18,6 +17,7 @@ from app.services.method.multimodel_search import get_multimodel_search
 from app.services.method.asr_ocr import get_asr_ocr_search
 from app.services.method.ic_search import get_ic_search
 from app.services.method.object_filter import ObjectFilterSearch
+from app.utils.ensemble import ensemble_weighted_sum, ensemble_z_scores
 from app.utils.scale import ScoreScaler
 from app.utils.translator import get_translator
 from app.services.gemini.query_augmentation import get_query_augmentor
@@ -30,92 +30,48 @@ router = APIRouter()
 # Increased workers for better concurrency with multiple users
 _search_executor = ThreadPoolExecutor(max_workers=20)
 
+# Below this many Q0+Q1+Q2 results the merge is cheaper than an executor hop
+_MERGE_OFFLOAD_MIN_RESULTS = 100
+
 
 def _ensemble_multimodal_results(clip_res, beit3_res, bigg_res, top_k):
     """Ensemble CLIP, BEiT3, BIGG results with z-score normalization."""
-    clip_z = ScoreScaler.z_score_normalize([r["score"] for r in clip_res])
-    beit3_z = ScoreScaler.z_score_normalize([r["score"] for r in beit3_res])
-    bigg_z = ScoreScaler.z_score_normalize([r["score"] for r in bigg_res])
-
-    # Weights for multimodal ensemble
-    clip_weight = 0.25
-    beit3_weight = 0.50
-    bigg_weight = 0.25
-
-    ensemble = defaultdict(float)
-    meta = {}
-
-    def accumulate(res, zlist, w):
-        for r, z in zip(res, zlist):
-            rid = r["id"]
-            ensemble[rid] += z * w
-            if rid not in meta:
-                meta[rid] = r
-
-    accumulate(clip_res, clip_z, clip_weight)
-    accumulate(beit3_res, beit3_z, beit3_weight)
-    accumulate(bigg_res, bigg_z, bigg_weight)
-
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    final_scores = ScoreScaler.min_max_scale([s for _, s in ranked])
-
-    results = []
-    for (rid, _), s in zip(ranked, final_scores):
-        item = meta.get(rid, {}).copy()
-        item["score"] = s
-        item["id"] = rid
-        results.append(item)
-
-    return results
+    return ensemble_z_scores([clip_res, beit3_res, bigg_res], get_multimodel_search().ensemble_weights, top_k)
 
 
 def _ensemble_all_methods(method_results: Dict[str, List[Dict]], top_k: int):
     """Ensemble results from multiple methods."""
-    ensemble = defaultdict(float)
-    meta = {}
-
     num_methods = len(method_results)
     if num_methods == 0:
         return []
 
-    weight_per_method = 1.0 / num_methods
+    return ensemble_weighted_sum(list(method_results.values()), [1.0 / num_methods] * num_methods, top_k)
 
-    for method_name, results in method_results.items():
-        if not results:
-            continue
 
-        for r in results:
-            rid = r["id"]
-            score = r["score"]
-            ensemble[rid] += score * weight_per_method
-            if rid not in meta:
-                meta[rid] = r
-
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
-    final_results = []
-    for rid, combined_score in ranked:
-        item = meta.get(rid, {}).copy()
-        item["score"] = combined_score
-        item["id"] = rid
-        final_results.append(item)
-
-    return final_results
-
-
-def _search_single_query_sync(query_text: str, enabled_methods: set, top_k: int, mode: str, ocr_query_text: str):
+def _search_single_query_sync(
+    query_text: str,
+    enabled_methods: set,
+    top_k: int,
+    mode: str,
+    ocr_query_text: str,
+    multimodal_batch: Optional[Tuple[List[Future], int]] = None
+):
     """
     Synchronous single query search - executes all enabled methods.
     Returns (per_method_results, final_results)
+    multimodal_batch: (futures, index) from MultiModelSearch.submit_all_models_batch
+    covering this query, instead of running its own multimodal search.
     """
     per_method_results = {}
     
     # 1. Multimodal search
     if "multimodal" in enabled_methods:
-        multimodel_search = get_multimodel_search()
-        clip_res = multimodel_search.search_single_model(query_text, "clip", top_k * 2)
-        beit3_res = multimodel_search.search_single_model(query_text, "beit3", top_k * 2)
-        bigg_res = multimodel_search.search_single_model(query_text, "bigg", top_k * 2)
+        if multimodal_batch is not None:
+            futures, idx = multimodal_batch
+            clip_res, beit3_res, bigg_res = (f.result()[idx] for f in futures)
+        else:
+            multimodel_search = get_multimodel_search()
+            clip_res, beit3_res, bigg_res = multimodel_search.search_all_models(query_text, top_k * 2)
         
         multimodal_ensemble = _ensemble_multimodal_results(clip_res, beit3_res, bigg_res, top_k)
         per_method_results["multimodal"] = multimodal_ensemble
@@ -128,31 +84,26 @@ def _search_single_query_sync(query_text: str, enabled_methods: set, top_k: int,
     # 2. IC search
     if "ic" in enabled_methods:
         ic_results = get_ic_search().search(query_text, top_k)
-        if ic_results:
-            raw_scores = [r["score"] for r in ic_results]
-            scaled_scores = ScoreScaler.min_max_scale(raw_scores)
-            for r, scaled in zip(ic_results, scaled_scores):
-                r["score"] = scaled
+        ScoreScaler.scale_results(ic_results, ScoreScaler.min_max_scale)
         per_method_results["ic"] = ic_results
     
+    # ASR + OCR in a single Elasticsearch msearch when both are enabled
+    text_results = {}
+    if "asr" in enabled_methods and "ocr" in enabled_methods:
+        text_results["asr"], text_results["ocr"] = get_asr_ocr_search().search_asr_and_ocr(
+            query_text, ocr_query_text, top_k
+        )
+    
     # 3. ASR search
     if "asr" in enabled_methods:
-        asr_results = get_asr_ocr_search().search_asr(query_text, top_k)
-        if asr_results:
-            raw_scores = [r["score"] for r in asr_results]
-            scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-            for r, scaled in zip(asr_results, scaled_scores):
-                r["score"] = scaled
+        asr_results = text_results["asr"] if "asr" in text_results else get_asr_ocr_search().search_asr(query_text, top_k)
+        ScoreScaler.scale_results(asr_results, ScoreScaler.bm25_scale)
         per_method_results["asr"] = asr_results
     
     # 4. OCR search
     if "ocr" in enabled_methods:
-        ocr_results = get_asr_ocr_search().search_ocr(ocr_query_text, top_k)
-        if ocr_results:
-            raw_scores = [r["score"] for r in ocr_results]
-            scaled_scores = ScoreScaler.bm25_scale(raw_scores)
-            for r, scaled in zip(ocr_results, scaled_scores):
-                r["score"] = scaled
+        ocr_results = text_results["ocr"] if "ocr" in text_results else get_asr_ocr_search().search_ocr(ocr_query_text, top_k)
+        ScoreScaler.scale_results(ocr_results, ScoreScaler.bm25_scale)
         per_method_results["ocr"] = ocr_results
     
     # 5. Ensemble if multiple methods
@@ -164,13 +115,26 @@ def _search_single_query_sync(query_text: str, enabled_methods: set, top_k: int,
     return per_method_results, final_results
 
 
-async def _search_single_query_async(query_text: str, enabled_methods: set, top_k: int, mode: str, ocr_query_text: str):
+def _merge_query_variants(variant_results: List[List[Dict]], top_k: int) -> List[Dict]:
+    """Ensemble Q0, Q1, Q2 results with equal weight for each query variant."""
+    weight = 1.0 / len(variant_results)
+    return ensemble_weighted_sum(variant_results, [weight] * len(variant_results), top_k)
+
+
+async def _search_single_query_async(
+    query_text: str,
+    enabled_methods: set,
+    top_k: int,
+    mode: str,
+    ocr_query_text: str,
+    multimodal_batch: Optional[Tuple[List[Future], int]] = None
+):
     """Async wrapper for single query search"""
     loop = asyncio.get_event_loop()
     return await loop.run_in_executor(
         _search_executor,
         _search_single_query_sync,
-        query_text, enabled_methods, top_k, mode, ocr_query_text
+        query_text, enabled_methods, top_k, mode, ocr_query_text, multimodal_batch
     )
 
 
@@ -182,7 +146,7 @@ async def _process_single_stage(stage: StageQuerySection, top_k: int, mode: str,
     3. Ensemble Q0, Q1, Q2 results
     4. Apply object filter
     """
-    logger.info(f"[MULTISTAGE] Processing stage {stage.stage_id}: '{stage.query}'")
+    logger.debug("[MULTISTAGE] Processing stage %s: '%s'", stage.stage_id, stage.query)
     
     # Determine enabled methods from toggles
     enabled_methods = set()
@@ -196,7 +160,7 @@ async def _process_single_stage(stage: StageQuerySection, top_k: int, mode: str,
         enabled_methods.add("ocr")
     
     if not enabled_methods:
-        logger.warning(f"[MULTISTAGE] Stage {stage.stage_id} has no enabled methods")
+        logger.warning("[MULTISTAGE] Stage %s has no enabled methods", stage.stage_id)
         return StageSearchResult(
             stage_id=stage.stage_id,
             stage_name=stage.stage_name or f"Stage {stage.stage_id}",
@@ -210,62 +174,73 @@ async def _process_single_stage(stage: StageQuerySection, top_k: int, mode: str,
             per_method_results={} if mode in ["A", "M"] else None
         )
     
-    # Translate query if not using ASR
+    loop = asyncio.get_event_loop()
+    
+    # Translate query if not using ASR (blocking HTTP call -> executor)
     query_text = stage.query
     if "asr" not in enabled_methods:
         translator = get_translator()
         if translator.is_vietnamese(query_text):
-            query_text = translator.translate(query_text)
-            logger.info(f"[MULTISTAGE] Stage {stage.stage_id} translated: '{query_text}'")
+            query_text = await loop.run_in_executor(_search_executor, translator.translate, query_text)
+            logger.debug("[MULTISTAGE] Stage %s translated: '%s'", stage.stage_id, query_text)
     
-    # Augment query: Q0 (original/translated), Q1, Q2
-    q1, q2 = augmentor.augment_query(query_text)
     q0 = query_text  # Q0 = original (or translated)
     
-    logger.info(f"[MULTISTAGE] Stage {stage.stage_id} queries: Q0='{q0}', Q1='{q1}', Q2='{q2}'")
-    
     # OCR text handling
     ocr_query_text = stage.ocr_text or query_text
     
-    # Search Q0, Q1, Q2 in parallel
-    q0_task = _search_single_query_async(q0, enabled_methods, top_k, mode, ocr_query_text)
-    q1_task = _search_single_query_async(q1, enabled_methods, top_k, mode, ocr_query_text)
-    q2_task = _search_single_query_async(q2, enabled_methods, top_k, mode, ocr_query_text)
+    # Q0 does not depend on Gemini -> start its search while Q1, Q2 are being generated
+    q0_task = asyncio.ensure_future(_search_single_query_async(q0, enabled_methods, top_k, mode, ocr_query_text))
+    
+    # Augment query: Q1, Q2 (blocking Gemini call -> executor, stages stay concurrent)
+    try:
+        q1, q2 = await loop.run_in_executor(_search_executor, augmentor.augment_query, query_text)
+    except BaseException:
+        q0_task.cancel()
+        raise
+    
+    logger.debug("[MULTISTAGE] Stage %s queries: Q0='%s', Q1='%s', Q2='%s'", stage.stage_id, q0, q1, q2)
+    
+    # Q1 + Q2 multimodal: one batched embedding request and one Qdrant search_batch RPC per model for both
+    q12_multimodal = None
+    if "multimodal" in enabled_methods:
+        q12_multimodal = get_multimodel_search().submit_all_models_batch([q1, q2], top_k * 2)
+    
+    # Search Q1, Q2 in parallel with the already running Q0
+    q1_task = _search_single_query_async(
+        q1, enabled_methods, top_k, mode, ocr_query_text, (q12_multimodal, 0) if q12_multimodal else None
+    )
+    q2_task = _search_single_query_async(
+        q2, enabled_methods, top_k, mode, ocr_query_text, (q12_multimodal, 1) if q12_multimodal else None
+    )
     
     (q0_per_method, q0_results), (q1_per_method, q1_results), (q2_per_method, q2_results) = await asyncio.gather(
         q0_task, q1_task, q2_task
     )
     
-    logger.info(f"[MULTISTAGE] Stage {stage.stage_id} Q0 results: {len(q0_results)}, Q1: {len(q1_results)}, Q2: {len(q2_results)}")
-    
-    # Ensemble Q0, Q1, Q2 results
-    # Equal weight for each query variant
-    ensemble = defaultdict(float)
-    meta = {}
-    
-    for results in [q0_results, q1_results, q2_results]:
-        for r in results:
-            rid = r["id"]
-            ensemble[rid] += r["score"] / 3.0  # Average of 3 queries
-            if rid not in meta:
-                meta[rid] = r
+    logger.debug(
+        "[MULTISTAGE] Stage %s Q0 results: %d, Q1: %d, Q2: %d",
+        stage.stage_id, len(q0_results), len(q1_results), len(q2_results)
+    )
     
-    ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-    stage_results = []
-    for rid, combined_score in ranked:
-        item = meta.get(rid, {}).copy()
-        item["score"] = combined_score
-        item["id"] = rid
-        stage_results.append(item)
+    # Ensemble Q0, Q1, Q2 results (off the event loop when the merge is large enough to matter)
+    variant_results = [q0_results, q1_results, q2_results]
+    if sum(len(r) for r in variant_results) < _MERGE_OFFLOAD_MIN_RESULTS:
+        stage_results = _merge_query_variants(variant_results, top_k)
+    else:
+        loop = asyncio.get_event_loop()
+        stage_results = await loop.run_in_executor(
+            _search_executor, _merge_query_variants, variant_results, top_k
+        )
     
     # Apply object filter if enabled
     if stage.selected_objects and len(stage.selected_objects) > 0:
-        logger.info(f"[MULTISTAGE] Stage {stage.stage_id} applying object filter: {stage.selected_objects}")
+        logger.debug("[MULTISTAGE] Stage %s applying object filter: %s", stage.stage_id, stage.selected_objects)
         obj_filter = ObjectFilterSearch()
         
         # Filter ensemble results
         original_ids = [str(r["id"]) for r in stage_results]
-        filtered_ids = obj_filter.filter(original_ids, stage.selected_objects)
+        filtered_ids = set(obj_filter.filter(original_ids, stage.selected_objects))
         stage_results = [r for r in stage_results if str(r["id"]) in filtered_ids]
         
         # Also filter individual query results for mode A
@@ -276,7 +251,7 @@ async def _process_single_stage(stage: StageQuerySection, top_k: int, mode: str,
         else:
             q0_filtered = q1_filtered = q2_filtered = None
             
-        logger.info(f"[MULTISTAGE] Stage {stage.stage_id} after object filter: {len(stage_results)} ensemble results")
+        logger.debug("[MULTISTAGE] Stage %s after object filter: %d ensemble results", stage.stage_id, len(stage_results))
     else:
         # No object filter
         if mode == "A" or mode == "M":
@@ -328,9 +303,13 @@ async def search_multistage(request: MultiStageSearchRequest):
         if not request.stages:
             raise HTTPException(status_code=400, detail="At least one stage is required")
         
-        logger.info(f"[MULTISTAGE] Processing {len(request.stages)} stages")
-        for i, stage in enumerate(request.stages):
-            logger.info(f"[MULTISTAGE] Stage {i}: id={stage.stage_id}, query='{stage.query}', toggles={stage.toggles}, objects={stage.selected_objects}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[MULTISTAGE] Processing %d stages", len(request.stages))
+            for i, stage in enumerate(request.stages):
+                logger.debug(
+                    "[MULTISTAGE] Stage %d: id=%s, query='%s', toggles=%s, objects=%s",
+                    i, stage.stage_id, stage.query, stage.toggles, stage.selected_objects
+                )
         
         # Initialize query augmentor
         augmentor = get_query_augmentor()
@@ -349,7 +328,7 @@ async def search_multistage(request: MultiStageSearchRequest):
         # Temporal aggregation if requested
         temporal_aggregation = None
         if request.temporal_mode in ["tuple", "id"]:
-            logger.info(f"[MULTISTAGE] Performing temporal aggregation mode: {request.temporal_mode}")
+            logger.debug("[MULTISTAGE] Performing temporal aggregation mode: %s", request.temporal_mode)
             
             # Extract ensemble_of_ensemble results from each stage (Q3 results)
             # For now, use the final stage results as proxy for ensemble_of_ensemble
@@ -362,7 +341,7 @@ async def search_multistage(request: MultiStageSearchRequest):
                     "results": aggregated_results[:top_k],  # Limit to top_k
                     "total": len(aggregated_results)
                 }
-                logger.info(f"[MULTISTAGE] ID aggregation: {len(aggregated_results)} unique ids")
+                logger.debug("[MULTISTAGE] ID aggregation: %d unique ids", len(aggregated_results))
             
             elif request.temporal_mode == "tuple":
                 tuples = find_temporal_tuples(stage_result_lists, max_tuples=top_k)
@@ -371,7 +350,7 @@ async def search_multistage(request: MultiStageSearchRequest):
                     "tuples": tuples,
                     "total": len(tuples)
                 }
-                logger.info(f"[MULTISTAGE] Tuple mode: {len(tuples)} valid tuples")
+                logger.debug("[MULTISTAGE] Tuple mode: %d valid tuples", len(tuples))
         
         # Log for monitoring
         log_search_query(
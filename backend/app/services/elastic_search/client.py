@@ -0,0 +1,74 @@
+"""
+Shared Elasticsearch client
+One connection pool per process for search services (ASR/OCR, object filter)
+"""
+import logging
+import threading
+from typing import Any, Optional
+
+from elasticsearch import Elasticsearch
+
+from app.core.config import settings
+from app.services.elastic_search.serializer import OrjsonSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def create_es_client(host: Optional[str] = None, port: Optional[int] = None, **overrides: Any) -> Elasticsearch:
+    """
+    Build an Elasticsearch client from settings.
+
+    Args:
+        host: Override ELASTICSEARCH_HOST
+        port: Override ELASTICSEARCH_PORT
+        overrides: Extra/overridden Elasticsearch(...) keyword arguments
+    """
+    host = host or settings.ELASTICSEARCH_HOST or "localhost"
+    port = port or settings.ELASTICSEARCH_PORT or 9200
+    scheme = "https" if settings.ELASTICSEARCH_USE_SSL else "http"
+
+    config = {
+        "hosts": [f"{scheme}://{host}:{port}"],
+        "request_timeout": settings.ELASTICSEARCH_REQUEST_TIMEOUT,
+        "max_retries": settings.ELASTICSEARCH_MAX_RETRIES,
+        "retry_on_timeout": settings.ELASTICSEARCH_RETRY_ON_TIMEOUT,
+        "serializer": OrjsonSerializer(),
+        "connections_per_node": settings.ELASTICSEARCH_CONNECTIONS_PER_NODE,
+        # Use ES 8.x compatibility headers
+        "headers": {
+            "Accept": "application/vnd.elasticsearch+json; compatible-with=8",
+            "Content-Type": "application/vnd.elasticsearch+json; compatible-with=8"
+        }
+    }
+
+    if settings.ELASTICSEARCH_USER and settings.ELASTICSEARCH_PASSWORD:
+        config["basic_auth"] = (
+            settings.ELASTICSEARCH_USER,
+            settings.ELASTICSEARCH_PASSWORD
+        )
+
+    if settings.ELASTICSEARCH_USE_SSL:
+        config["verify_certs"] = settings.ELASTICSEARCH_VERIFY_CERTS
+
+    config.update(overrides)
+    return Elasticsearch(**config)
+
+
+_es_client: Optional[Elasticsearch] = None
+_es_lock = threading.Lock()
+
+
+def get_es_client() -> Elasticsearch:
+    """Get the shared Elasticsearch client (connection checked once on first use)"""
+    global _es_client
+    if _es_client is None:
+        with _es_lock:
+            if _es_client is None:
+                client = create_es_client()
+                try:
+                    client.info()
+                except Exception as e:
+                    logger.error(f"Elasticsearch connection failed: {e}")
+                    raise
+                _es_client = client
+    return _es_client
@@ -2,18 +2,37 @@
 Elasticsearch ingestion script for JSON files in es_data folder
 Uses bulk API to ingest all JSON files with index names based on file names (lowercase)
 """
-import json
 import logging
+import mmap
+import os
+from itertools import chain
 from pathlib import Path
-from typing import Dict, Any, List
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
+from typing import Dict, Any, Iterator, Tuple
+import ijson
+import orjson
+from elasticsearch.helpers import parallel_bulk
 from tqdm import tqdm
 
 from app.core.config import settings
+from app.services.elastic_search.client import create_es_client
 
 logger = logging.getLogger(__name__)
 
+# Files above this size are streamed with ijson instead of decoded in memory
+MMAP_LOAD_MAX_BYTES = 1024 * 1024 * 1024
+
+# Index settings while bulk loading: no refresh, no replicas, async translog fsync
+BULK_INDEX_SETTINGS = {
+    "index": {
+        "refresh_interval": "-1",
+        "number_of_replicas": 0,
+        "translog": {
+            "durability": "async",
+            "sync_interval": "30s"
+        }
+    }
+}
+
 
 class ElasticsearchIngester:
     """Elasticsearch ingester for JSON files"""
@@ -29,41 +48,9 @@ class ElasticsearchIngester:
         self.port = port or settings.ELASTICSEARCH_PORT or 9200
         self.index_prefix = index_prefix or settings.ELASTICSEARCH_INDEX_PREFIX or "es_data"
         
-        # Build Elasticsearch connection URL
-        es_url = f"http://{self.host}:{self.port}"
-        
-        # Prepare client configuration
-        # Use compatibility headers for Elasticsearch 8.x server
-        from elasticsearch import __versionstr__
-        client_config = {
-            "hosts": [es_url],
-            "request_timeout": settings.ELASTICSEARCH_REQUEST_TIMEOUT,
-            "max_retries": settings.ELASTICSEARCH_MAX_RETRIES,
-            "retry_on_timeout": settings.ELASTICSEARCH_RETRY_ON_TIMEOUT,
-            # Set headers to use ES 8.x compatibility
-            "headers": {
-                "Accept": "application/vnd.elasticsearch+json; compatible-with=8",
-                "Content-Type": "application/vnd.elasticsearch+json; compatible-with=8"
-            }
-        }
-        
-        # Add authentication if provided
-        if settings.ELASTICSEARCH_USER and settings.ELASTICSEARCH_PASSWORD:
-            client_config["basic_auth"] = (
-                settings.ELASTICSEARCH_USER,
-                settings.ELASTICSEARCH_PASSWORD
-            )
-        
-        # Add SSL configuration if enabled
-        if settings.ELASTICSEARCH_USE_SSL:
-            client_config["use_ssl"] = True
-            client_config["verify_certs"] = settings.ELASTICSEARCH_VERIFY_CERTS
-            # Use https URL
-            es_url = f"https://{self.host}:{self.port}"
-            client_config["hosts"] = [es_url]
-        
         # Initialize Elasticsearch client
-        self.client = Elasticsearch(**client_config)
+        # gzip request bodies: bulk payloads are mostly ASR/OCR text and compress well
+        self.client = create_es_client(self.host, self.port, http_compress=True)
         
         # Test connection - use info() instead of ping() for better compatibility
         try:
@@ -75,13 +62,22 @@ class ElasticsearchIngester:
             logger.error(f"   Host: {self.host}, Port: {self.port}")
             raise
     
-    def load_json_file(self, file_path: Path) -> Dict[str, Any]:
-        """Load JSON file"""
+    def iter_json_items(self, file_path: Path) -> Iterator[Tuple[str, Any]]:
+        """
+        Iterate (key, value) pairs of a top-level JSON object.
+
+        Files up to MMAP_LOAD_MAX_BYTES are memory-mapped and decoded in one
+        orjson pass (no extra read() copy); larger files are streamed with ijson.
+        """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            logger.info(f"✅ Loaded {file_path.name}: {len(data)} records")
-            return data
+            with open(file_path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if 0 < size <= MMAP_LOAD_MAX_BYTES:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buf:
+                        data = orjson.loads(buf)
+                    yield from data.items()
+                else:
+                    yield from ijson.kvitems(f, "", use_float=True)
         except Exception as e:
             logger.error(f"❌ Failed to load {file_path}: {e}")
             raise
@@ -93,31 +89,40 @@ class ElasticsearchIngester:
         first_value = data_sample[first_key]
         
         # Determine field type
+        # "id" duplicates _id and is never queried/sorted -> keep it in _source only
+        id_field = {
+            "type": "keyword",
+            "index": False,
+            "doc_values": False
+        }
+        
         if isinstance(first_value, str):
             # Text field for string values (IC, ASR, OCR)
+            # BM25 needs term freqs but not positions (no phrase queries);
+            # norms are kept so length normalization still ranks short OCR/ASR hits fairly
             mapping = {
                 "mappings": {
                     "properties": {
-                        "id": {
-                            "type": "keyword"
-                        },
+                        "id": id_field,
                         "content": {
                             "type": "text",
-                            "analyzer": "standard"
+                            "analyzer": "standard",
+                            "index_options": "freqs"
                         }
                     }
                 }
             }
         elif isinstance(first_value, list):
-            # Keyword array for object lists (OBJECT)
+            # Keyword array for object lists (OBJECT) - only used in term filters
             mapping = {
                 "mappings": {
                     "properties": {
-                        "id": {
-                            "type": "keyword"
-                        },
+                        "id": id_field,
                         "objects": {
-                            "type": "keyword"
+                            "type": "keyword",
+                            "index_options": "docs",
+                            "norms": False,
+                            "doc_values": False
                         }
                     }
                 }
@@ -127,50 +132,60 @@ class ElasticsearchIngester:
             mapping = {
                 "mappings": {
                     "properties": {
-                        "id": {
-                            "type": "keyword"
-                        },
+                        "id": id_field,
                         "content": {
-                            "type": "text"
+                            "type": "text",
+                            "index_options": "freqs"
                         }
                     }
                 }
             }
         
+        mapping["settings"] = BULK_INDEX_SETTINGS
         return mapping
     
-    def prepare_documents(self, data: Dict[str, Any], index_name: str) -> List[Dict[str, Any]]:
-        """Prepare documents for bulk ingestion"""
-        documents = []
-        
-        for key, value in data.items():
-            doc = {
-                "_index": index_name,
-                "_id": key,
-            }
-            
-            if isinstance(value, str):
-                # For IC, ASR, OCR - text content
-                doc["_source"] = {
-                    "id": key,
-                    "content": value
-                }
-            elif isinstance(value, list):
-                # For OBJECT - array of objects
-                doc["_source"] = {
-                    "id": key,
-                    "objects": value
-                }
-            else:
-                # Fallback
-                doc["_source"] = {
-                    "id": key,
-                    "content": str(value)
-                }
-            
-            documents.append(doc)
-        
-        return documents
+    def restore_index_settings(self, index_name: str, reset_replicas: bool) -> None:
+        """Reset bulk-load settings back to Elasticsearch defaults (null = default)"""
+        index_settings = {
+            "refresh_interval": None,
+            "translog.durability": None
+        }
+        if reset_replicas:
+            index_settings["number_of_replicas"] = None
+        try:
+            self.client.indices.put_settings(index=index_name, settings={"index": index_settings})
+            self.client.indices.refresh(index=index_name)
+        except Exception as e:
+            logger.error(f"❌ Failed to restore settings for {index_name}: {e}")
+    
+    def optimize_index(self, index_name: str) -> None:
+        """Merge segments after a full load (index is read-only afterwards)"""
+        try:
+            logger.info(f"🔧 Force merging {index_name} into 1 segment...")
+            self.client.options(request_timeout=3600).indices.forcemerge(
+                index=index_name, max_num_segments=1
+            )
+        except Exception as e:
+            logger.warning(f"⚠️  Force merge failed for {index_name}: {e}")
+    
+    def iter_actions(self, items: Iterator[Tuple[str, Any]], index_name: str, sample_value: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Yield bulk actions one by one from streamed (key, value) pairs.
+        The document shape is picked once from sample_value (files are homogeneous,
+        same assumption as create_index_mapping) instead of per document.
+        """
+        if isinstance(sample_value, str):
+            # For IC, ASR, OCR - text content
+            for key, value in items:
+                yield {"_index": index_name, "_id": key, "_source": {"id": key, "content": value}}
+        elif isinstance(sample_value, list):
+            # For OBJECT - array of objects
+            for key, value in items:
+                yield {"_index": index_name, "_id": key, "_source": {"id": key, "objects": value}}
+        else:
+            # Fallback
+            for key, value in items:
+                yield {"_index": index_name, "_id": key, "_source": {"id": key, "content": str(value)}}
     
     def ingest_file(self, file_path: Path, batch_size: int = 1000) -> None:
         """Ingest a single JSON file into Elasticsearch"""
@@ -179,17 +194,19 @@ class ElasticsearchIngester:
         
         logger.info(f"📦 Starting ingestion for {file_path.name} -> index: {index_name}")
         
-        # Load JSON data
-        data = self.load_json_file(file_path)
+        # Stream JSON data; peek the first record to build the mapping
+        items = self.iter_json_items(file_path)
+        first = next(items, None)
         
-        if not data:
+        if first is None:
             logger.warning(f"⚠️  No data in {file_path.name}, skipping")
             return
         
-        # Check if index exists, create if not
-        if not self.client.indices.exists(index=index_name):
+        # Check if index exists, create if not (with bulk-load settings)
+        created = not self.client.indices.exists(index=index_name)
+        if created:
             logger.info(f"📝 Creating index: {index_name}")
-            mapping = self.create_index_mapping(index_name, data)
+            mapping = self.create_index_mapping(index_name, dict([first]))
             # Elasticsearch 8.x Python client - use mappings parameter directly
             self.client.indices.create(
                 index=index_name,
@@ -198,41 +215,45 @@ class ElasticsearchIngester:
             )
         else:
             logger.info(f"ℹ️  Index {index_name} already exists, will update documents")
+            self.client.indices.put_settings(
+                index=index_name,
+                settings={"index": {"refresh_interval": "-1", "translog.durability": "async"}}
+            )
         
-        # Prepare documents
-        documents = self.prepare_documents(data, index_name)
-        
-        # Bulk ingest with progress bar
-        total_docs = len(documents)
-        logger.info(f"🚀 Ingesting {total_docs} documents into {index_name}...")
+        # Stream actions (working set is one bulk chunk, not the whole file)
+        # A chunk is flushed at batch_size docs or ELASTICSEARCH_BULK_MAX_BYTES, whichever comes first
+        actions = self.iter_actions(chain([first], items), index_name, sample_value=first[1])
+        logger.info(f"🚀 Ingesting documents into {index_name}...")
         
         success_count = 0
         failed_count = 0
         
-        # Process in batches
-        for i in tqdm(range(0, total_docs, batch_size), desc=f"Ingesting {index_name}"):
-            batch = documents[i:i + batch_size]
-            
-            try:
-                success, failed_items = bulk(
+        try:
+            for ok, item in tqdm(
+                parallel_bulk(
                     self.client,
-                    batch,
+                    actions,
+                    thread_count=settings.ELASTICSEARCH_BULK_THREADS,
+                    chunk_size=batch_size,
+                    max_chunk_bytes=settings.ELASTICSEARCH_BULK_MAX_BYTES,
+                    queue_size=4,
                     raise_on_error=False,
-                    stats_only=False
-                )
-                
-                success_count += success
-                failed_count += len(failed_items) if failed_items else 0
-                
-                # Log failed items if any
-                if failed_items:
-                    for item in failed_items:
-                        error_info = item.get('index', {})
-                        logger.warning(f"⚠️  Failed to index document {error_info.get('_id')}: {error_info.get('error', 'Unknown error')}")
-                
-            except Exception as e:
-                logger.error(f"❌ Error ingesting batch {i//batch_size + 1}: {e}")
-                failed_count += len(batch)
+                    raise_on_exception=False
+                ),
+                desc=f"Ingesting {index_name}",
+                unit="docs"
+            ):
+                if ok:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                    error_info = item.get('index', {})
+                    logger.warning(f"⚠️  Failed to index document {error_info.get('_id')}: {error_info.get('error', 'Unknown error')}")
+        finally:
+            # Always restore refresh/translog/replicas, even if ingestion aborted
+            self.restore_index_settings(index_name, reset_replicas=created)
+        
+        self.optimize_index(index_name)
         
         logger.info(f"✅ Completed {index_name}: {success_count} succeeded, {failed_count} failed")
     
@@ -314,7 +335,7 @@ def main():
     
     # Ingest all files
     try:
-        ingester.ingest_all_files(data_dir, batch_size=20000)
+        ingester.ingest_all_files(data_dir, batch_size=5000)
     except Exception as e:
         logger.error(f"❌ Ingestion failed: {e}")
         sys.exit(1)
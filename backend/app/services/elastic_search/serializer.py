@@ -0,0 +1,36 @@
+"""
+orjson-based serializer for the Elasticsearch client
+Used for request bodies (search, bulk action lines) and response parsing
+"""
+from typing import Any
+
+import orjson
+from elasticsearch.exceptions import SerializationError
+from elasticsearch.serializer import JSONSerializer
+
+
+class OrjsonSerializer(JSONSerializer):
+    """Drop-in replacement for the default JSONSerializer backed by orjson"""
+
+    def loads(self, data: bytes) -> Any:
+        if data == b"":
+            return None
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise SerializationError(f"Unable to deserialize as JSON: {data!r}", errors=(e,))
+
+    def dumps(self, data: Any) -> bytes:
+        # Pre-serialized bodies (e.g. bulk action lines) pass through untouched
+        if isinstance(data, str):
+            return data.encode("utf-8", "surrogatepass")
+        if isinstance(data, bytes):
+            return data
+        try:
+            return orjson.dumps(
+                data,
+                default=self.default,
+                option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+            )
+        except (TypeError, orjson.JSONEncodeError) as e:
+            raise SerializationError(f"Unable to serialize to JSON: {data!r} (type: {type(data).__name__})", errors=(e,))
@@ -1,6 +1,7 @@
 import json
 import logging
-from typing import List, Tuple
+import threading
+from typing import List, Tuple, TypedDict
 import google.generativeai as genai
 from app.core.config import settings
 from app.services.gemini.reset_api_key import APIKeyManager
@@ -8,6 +9,29 @@ from app.services.gemini.reset_api_key import APIKeyManager
 logger = logging.getLogger(__name__)
 
 
+AUGMENT_PROMPT = """Generate 2 alternative search queries for video retrieval based on this original query.
+The alternative queries should:
+1. Use different wording but maintain the same semantic meaning
+2. Be suitable for video search (describe visual content, actions, objects, scenes)
+3. Be concise (5-15 words each)
+
+Original query: "{query}"
+
+Return a JSON object with keys "q1" and "q2"."""
+
+
+class AugmentedQueries(TypedDict):
+    q1: str
+    q2: str
+
+
+# JSON mode: Gemini returns bare JSON matching the schema (no markdown fences)
+GENERATION_CONFIG = {
+    "response_mime_type": "application/json",
+    "response_schema": AugmentedQueries,
+}
+
+
 class QueryAugmentor:
     """Use Gemini to generate augmented queries for video search"""
     
@@ -22,7 +46,7 @@ class QueryAugmentor:
         """Get Gemini client with next available API key"""
         api_key = self.key_manager.get_next_key()
         genai.configure(api_key=api_key)
-        return genai.GenerativeModel(self.model_name)
+        return genai.GenerativeModel(self.model_name, generation_config=GENERATION_CONFIG)
     
     def augment_query(self, original_query: str) -> Tuple[str, str]:
         """
@@ -34,34 +58,13 @@ class QueryAugmentor:
             logger.warning("[QUERY AUG] Empty query, returning original")
             return (original_query, original_query)
         
-        prompt = f"""Generate 2 alternative search queries for video retrieval based on this original query.
-The alternative queries should:
-1. Use different wording but maintain the same semantic meaning
-2. Be suitable for video search (describe visual content, actions, objects, scenes)
-3. Be concise (5-15 words each)
-
-Original query: "{original_query}"
-
-Return ONLY a JSON object in this exact format:
-{{"q1": "first alternative query", "q2": "second alternative query"}}
-
-Do not include any explanation or additional text."""
+        prompt = AUGMENT_PROMPT.format(query=original_query)
 
         try:
             model = self._get_client()
             response = model.generate_content(prompt)
             
-            # Parse JSON from response
-            text = response.text.strip()
-            
-            # Remove markdown code blocks if present
-            if text.startswith("```"):
-                text = text.split("```")[1]
-                if text.startswith("json"):
-                    text = text[4:]
-                text = text.strip()
-            
-            result = json.loads(text)
+            result = json.loads(response.text)
             q1 = result.get("q1", original_query).strip()
             q2 = result.get("q2", original_query).strip()
             
@@ -82,11 +85,14 @@ Do not include any explanation or additional text."""
 
 # Singleton instance
 _augmentor_instance = None
+_augmentor_lock = threading.Lock()
 
 
 def get_query_augmentor() -> QueryAugmentor:
     """Get singleton query augmentor instance"""
     global _augmentor_instance
     if _augmentor_instance is None:
-        _augmentor_instance = QueryAugmentor()
+        with _augmentor_lock:
+            if _augmentor_instance is None:
+                _augmentor_instance = QueryAugmentor()
     return _augmentor_instance
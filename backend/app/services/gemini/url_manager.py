@@ -2,8 +2,10 @@
 URL Manager for load balancing between multiple embedding server URLs.
 Similar to APIKeyManager but for server URLs.
 """
+import itertools
 import threading
-from typing import List, Optional
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
 
 
 class URLManager:
@@ -25,8 +27,11 @@ class URLManager:
         if not self.urls:
             raise ValueError("At least one URL must be provided")
         
-        self._index = 0
-        self._lock = threading.Lock()
+        # next() on itertools.count is atomic under the GIL -> no Python-level lock needed
+        self._counter = itertools.count()
+        # Requests currently running against each URL (see acquire())
+        self._in_flight = [0] * len(self.urls)
+        self._in_flight_lock = threading.Lock()
     
     def get_next_url(self) -> str:
         """
@@ -36,11 +41,27 @@ class URLManager:
         Returns:
             Next URL
         """
-        with self._lock:
-            url = self.urls[self._index]
-            self._index = (self._index + 1) % len(self.urls)
-            return url
+        return self.urls[next(self._counter) % len(self.urls)]
     
+    @contextmanager
+    def acquire(self) -> Iterator[str]:
+        """
+        Lease the URL with the fewest in-flight requests for the duration of the with-block
+        (least-connections; ties rotate round-robin). A slow or overloaded server keeps
+        its requests open longer and so receives fewer new ones.
+        Thread-safe.
+        """
+        n = len(self.urls)
+        with self._in_flight_lock:
+            start = next(self._counter) % n
+            idx = min(((start + i) % n for i in range(n)), key=self._in_flight.__getitem__)
+            self._in_flight[idx] += 1
+        try:
+            yield self.urls[idx]
+        finally:
+            with self._in_flight_lock:
+                self._in_flight[idx] -= 1
+
     def get_all_urls(self) -> List[str]:
         """Get all available URLs"""
         return self.urls.copy()
@@ -48,3 +69,18 @@ class URLManager:
     def __len__(self):
         """Number of URLs"""
         return len(self.urls)
+
+
+_shared_managers: Dict[Tuple[str, ...], URLManager] = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_url_manager(urls: List[str]) -> URLManager:
+    """
+    One URLManager per server list, so clients that hit the same servers
+    (CLIP / BEiT3 / BigG on the multimodal servers) share in-flight counts.
+    """
+    manager = URLManager(urls)
+    key = tuple(manager.urls)
+    with _shared_lock:
+        return _shared_managers.setdefault(key, manager)
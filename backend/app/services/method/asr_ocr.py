@@ -1,101 +1,181 @@
 import logging
-from typing import List, Dict, Any, Optional
-from elasticsearch import Elasticsearch
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+from cachetools import TTLCache
 from app.core.config import settings
+from app.services.elastic_search.client import get_es_client
 from app.utils.mapping import get_keyframe_path, get_scene_keyframe_path
 
 logger = logging.getLogger(__name__)
 
 
 class ASROCRSearch:
+    # Per-method match options:
+    # ASR transcripts are noisy -> fuzzy matching;
+    # OCR tokens are exact machine-read strings -> no fuzzy expansion, all terms required
+    MATCH_OPTIONS = {
+        "asr": {"fuzziness": "AUTO"},
+        "ocr": {"operator": "and"},
+    }
+    # Trim responses to what _parse_hits reads (skips took/_shards/_index/... on the wire and in parsing)
+    SEARCH_FILTER_PATH = ["hits.hits._id", "hits.hits._score", "hits.hits._source.content"]
+    # responses.status is in every msearch item: filter_path drops array elements left empty,
+    # so without it a zero-hit response would vanish and shift the others
+    MSEARCH_FILTER_PATH = ["responses.status", "responses.hits.hits._id", "responses.hits.hits._score",
+                           "responses.hits.hits._source.content", "responses.error"]
+
     def __init__(self):
-        self.host = settings.ELASTICSEARCH_HOST or "localhost"
-        self.port = settings.ELASTICSEARCH_PORT or 9200
-
-        es_url = f"http://{self.host}:{self.port}"
-        config = {
-            "hosts": [es_url],
-            "request_timeout": settings.ELASTICSEARCH_REQUEST_TIMEOUT,
-            "max_retries": settings.ELASTICSEARCH_MAX_RETRIES,
-            "retry_on_timeout": settings.ELASTICSEARCH_RETRY_ON_TIMEOUT,
-            "headers": {
-                "Accept": "application/vnd.elasticsearch+json; compatible-with=8",
-                "Content-Type": "application/vnd.elasticsearch+json; compatible-with=8"
-            }
+        self.client = get_es_client()
+
+        # Result cache for repeated queries, keyed on (index, query, top_k, need_content)
+        self._cache = TTLCache(
+            maxsize=settings.ELASTICSEARCH_QUERY_CACHE_SIZE,
+            ttl=settings.ELASTICSEARCH_QUERY_CACHE_TTL
+        )
+        self._cache_lock = threading.Lock()
+
+    def _build_body(self, query: str, top_k: int, need_content: bool, method_name: str) -> Dict[str, Any]:
+        match_options = self.MATCH_OPTIONS.get(method_name, {"fuzziness": "AUTO"})
+        body = {
+            "query": {"match": {"content": {"query": query, **match_options}}},
+            "size": top_k
         }
-
-        if settings.ELASTICSEARCH_USER and settings.ELASTICSEARCH_PASSWORD:
-            config["basic_auth"] = (
-                settings.ELASTICSEARCH_USER,
-                settings.ELASTICSEARCH_PASSWORD
+        if not need_content:
+            # Only _id/_score are used downstream, skip loading stored _source
+            body["_source"] = False
+        return body
+
+    def _parse_hits(self, hits: List[Dict[str, Any]], method_name: str, need_content: bool) -> List[Dict[str, Any]]:
+        results = []
+        for hit in hits:
+            rid = hit["_id"]
+            path = (
+                get_keyframe_path(rid)
+                if method_name == "ocr"
+                else get_scene_keyframe_path(rid)
             )
 
-        if settings.ELASTICSEARCH_USE_SSL:
-            es_url = f"https://{self.host}:{self.port}"
-            config["hosts"] = [es_url]
-            config["use_ssl"] = True
-            config["verify_certs"] = settings.ELASTICSEARCH_VERIFY_CERTS
+            item = {
+                "id": rid,
+                "score": hit["_score"],
+                "method": method_name,
+                "keyframe_path": path
+            }
+            if need_content:
+                item["content"] = hit.get("_source", {}).get("content", "")
+            results.append(item)
 
-        try:
-            self.client = Elasticsearch(**config)
-            self.client.info()
-        except Exception as e:
-            logger.error(f"Elasticsearch connection failed: {e}")
-            raise
+        return results
+
+    def _cache_get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        # Callers rescale scores in place -> hand out copies
+        return [dict(r) for r in cached] if cached is not None else None
+
+    def _cache_put(self, key: tuple, results: List[Dict[str, Any]]) -> None:
+        with self._cache_lock:
+            self._cache[key] = [dict(r) for r in results]
 
     def search(
         self,
         query: str,
         index_name: str,
         method_name: str,
-        top_k: Optional[int] = None
+        top_k: Optional[int] = None,
+        need_content: bool = False
     ) -> List[Dict[str, Any]]:
 
         top_k = top_k or settings.DEFAULT_TOP_K
 
+        cache_key = (index_name, query, top_k, need_content)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            body = {
-                "query": {"match": {"content": {"query": query, "fuzziness": "AUTO"}}},
-                "size": top_k
-            }
+            body = self._build_body(query, top_k, need_content, method_name)
 
-            response = self.client.search(index=index_name, body=body)
+            response = self.client.search(index=index_name, body=body, filter_path=self.SEARCH_FILTER_PATH)
             hits = response.get("hits", {}).get("hits", [])
 
-            results = []
-            for hit in hits:
-                rid = hit["_id"]
-                path = (
-                    get_keyframe_path(rid)
-                    if method_name == "ocr"
-                    else get_scene_keyframe_path(rid)
-                )
-
-                results.append({
-                    "id": rid,
-                    "score": float(hit["_score"]),
-                    "content": hit["_source"].get("content", ""),
-                    "method": method_name,
-                    "keyframe_path": path
-                })
-
+            results = self._parse_hits(hits, method_name, need_content)
+            self._cache_put(cache_key, results)
             return results
 
         except Exception as e:
             logger.error(f"{method_name} search error: {e}")
             return []
 
-    def search_asr(self, query: str, top_k: Optional[int] = None):
-        return self.search(query, "asr", "asr", top_k)
+    def search_asr(self, query: str, top_k: Optional[int] = None, need_content: bool = False):
+        return self.search(query, "asr", "asr", top_k, need_content)
+
+    def search_ocr(self, query: str, top_k: Optional[int] = None, need_content: bool = False):
+        return self.search(query, "ocr", "ocr", top_k, need_content)
+
+    def search_asr_and_ocr(
+        self,
+        asr_query: str,
+        ocr_query: str,
+        top_k: Optional[int] = None,
+        need_content: bool = False
+    ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """ASR + OCR search in a single msearch round trip. Returns (asr_results, ocr_results)"""
+
+        top_k = top_k or settings.DEFAULT_TOP_K
+
+        asr_key = ("asr", asr_query, top_k, need_content)
+        ocr_key = ("ocr", ocr_query, top_k, need_content)
+        asr_cached = self._cache_get(asr_key)
+        ocr_cached = self._cache_get(ocr_key)
+
+        # One side cached -> a plain search for the other is enough
+        if asr_cached is not None or ocr_cached is not None:
+            if asr_cached is None:
+                asr_cached = self.search_asr(asr_query, top_k, need_content)
+            if ocr_cached is None:
+                ocr_cached = self.search_ocr(ocr_query, top_k, need_content)
+            return asr_cached, ocr_cached
+
+        searches = [
+            {"index": "asr"}, self._build_body(asr_query, top_k, need_content, "asr"),
+            {"index": "ocr"}, self._build_body(ocr_query, top_k, need_content, "ocr"),
+        ]
+
+        try:
+            responses = self.client.msearch(
+                searches=searches, filter_path=self.MSEARCH_FILTER_PATH
+            ).get("responses") or []
+        except Exception as e:
+            logger.error(f"asr+ocr msearch error: {e}")
+            return [], []
+
+        # Responses can't be matched to their searches -> one plain search each
+        if len(responses) != 2:
+            logger.warning(f"asr+ocr msearch returned {len(responses)} responses, falling back to single searches")
+            return self.search_asr(asr_query, top_k, need_content), self.search_ocr(ocr_query, top_k, need_content)
+
+        results = []
+        for method_name, cache_key, response in zip(("asr", "ocr"), (asr_key, ocr_key), responses):
+            if "error" in response:
+                logger.error(f"{method_name} search error: {response['error']}")
+                results.append([])
+                continue
+            hits = response.get("hits", {}).get("hits", [])
+            parsed = self._parse_hits(hits, method_name, need_content)
+            self._cache_put(cache_key, parsed)
+            results.append(parsed)
 
-    def search_ocr(self, query: str, top_k: Optional[int] = None):
-        return self.search(query, "ocr", "ocr", top_k)
+        return results[0], results[1]
 
 
 _instance: Optional[ASROCRSearch] = None
+_instance_lock = threading.Lock()
 
 def get_asr_ocr_search() -> ASROCRSearch:
     global _instance
     if _instance is None:
-        _instance = ASROCRSearch()
+        with _instance_lock:
+            if _instance is None:
+                _instance = ASROCRSearch()
     return _instance
@@ -1,15 +1,24 @@
-import requests
 import numpy as np
-from typing import List, Union
+from typing import Dict, Iterator, List, Union
 import logging
+from contextlib import contextmanager
+import threading
 from app.core.config import settings
-from app.services.gemini.url_manager import URLManager
+from app.services.gemini.url_manager import get_shared_url_manager
+from app.services.method.embedding_cache import clip_text_key, get_embedding_cache
+from app.services.method.http_session import (
+    BatchEndpointUnavailable, create_session, decode_embeddings, embed_length_sorted, fan_out_rows, warm_up_async
+)
 
 logger = logging.getLogger(__name__)
 
 
 class BigGClient:    
-    def __init__(self, base_url: str = None):
+    # Batch endpoint support per server URL, shared by all instances (probed once per process)
+    _batch_status: Dict[str, bool] = {}
+    _batch_lock = threading.Lock()
+
+    def __init__(self, base_url: str = None, strict: bool = False):
         if base_url:
             self.base_url = base_url.rstrip("/")
             self.url_manager = None
@@ -17,97 +26,99 @@ class BigGClient:
             if not settings.EMBEDDING_SERVER_MULTIMODAL:
                 raise ValueError("EMBEDDING_SERVER_MULTIMODAL must be set in environment variables")
             
-            # Use URL manager for load balancing
-            self.url_manager = URLManager(settings.EMBEDDING_SERVER_MULTIMODAL)
+            # Use URL manager for load balancing (shared with other clients of the same servers)
+            self.url_manager = get_shared_url_manager(settings.EMBEDDING_SERVER_MULTIMODAL)
             self.base_url = None  # Will be set per request
         
         self.timeout = 60
-        self._batch_available = None  # Cache batch endpoint availability
+        self.strict = strict  # Raise instead of returning an empty result once retries are exhausted
+        self.session = create_session()  # Reuse keep-alive connections across calls
+        warm_up_async(self.session, self.url_manager.get_all_urls() if self.url_manager else [self.base_url])
     
-    def _get_base_url(self) -> str:
-        """Get base URL with load balancing"""
+    @contextmanager
+    def _use_base_url(self) -> Iterator[str]:
+        """Base URL for one request (least-loaded server when load balancing)"""
         if self.base_url:
-            return self.base_url
-        if self.url_manager:
-            url = self.url_manager.get_next_url()
-            logger.debug(f"[BIGG] Using server: {url}")
-            return url.rstrip("/")
-        raise ValueError("No base URL available")
+            yield self.base_url
+        elif self.url_manager:
+            with self.url_manager.acquire() as url:
+                logger.debug(f"[BIGG] Using server: {url}")
+                yield url.rstrip("/")
+        else:
+            raise ValueError("No base URL available")
+
+    def _embed_one_text(self, text: str) -> np.ndarray:
+        """Single-text request (used when the batch endpoint is unavailable)"""
+        with self._use_base_url() as base_url:
+            response = self.session.post(f"{base_url}/embedding/bigg/text", json={"text": text}, timeout=self.timeout)
+        response.raise_for_status()
+        return decode_embeddings(response)[0]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """One request to the batch endpoint -> (len(texts), dim)"""
+        with self._use_base_url() as base_url:
+            status = self._batch_status.get(base_url)
+            if status is False:
+                raise BatchEndpointUnavailable(base_url)
+
+            response = self.session.post(f"{base_url}/embedding/bigg/text/batch", json={"texts": texts}, timeout=self.timeout)
+            if response.status_code in (404, 405):
+                with self._batch_lock:
+                    if self._batch_status.get(base_url) is not False:
+                        self._batch_status[base_url] = False
+                        logger.info(f"[BIGG] Batch endpoint not supported by {base_url} (status {response.status_code}), using individual calls")
+                raise BatchEndpointUnavailable(base_url)
+            response.raise_for_status()
+            if status is None:
+                with self._batch_lock:
+                    if base_url not in self._batch_status:
+                        self._batch_status[base_url] = True
+                        logger.info(f"[BIGG] Batch endpoint available on {base_url}")
+            return decode_embeddings(response)
 
     def extract_text_embedding(
         self,
         texts: Union[str, List[str]]
     ) -> np.ndarray:
-        """
-        Extract text embeddings from CLIP bigG model.
-        Optimized: sends all texts in one batch request if server supports it.
-        """
+        """Text embeddings from CLIP bigG; only texts missing from the embedding cache hit the server"""
         if isinstance(texts, str):
             texts = [texts]
 
         if not texts:
             return np.array([])
 
-        # Try batch endpoint first (only if not already checked)
-        if self._batch_available is None:
-            try:
-                base_url = self._get_base_url()
-                url = f"{base_url}/embedding/bigg/text/batch"
-                data = {"texts": texts}
-                response = requests.post(url, json=data, timeout=self.timeout)
-                
-                if response.status_code == 200:
-                    self._batch_available = True
-                    result = response.json()
-                    embeddings = [np.array(emb, dtype=np.float32) for emb in result["embeddings"]]
-                    logger.info(f"[BIGG] Batch endpoint available, processed {len(texts)} texts")
-                    return np.vstack(embeddings) if embeddings else np.array([])
-                else:
-                    self._batch_available = False
-                    logger.info(f"[BIGG] Batch endpoint not available (status {response.status_code}), using individual calls")
-            except requests.exceptions.HTTPError as e:
-                if "404" in str(e):
-                    self._batch_available = False
-                    logger.info(f"[BIGG] Batch endpoint not supported by server, using individual calls")
-                else:
-                    self._batch_available = False
-                    logger.warning(f"[BIGG] Batch endpoint error: {e}, using individual calls")
-            except Exception as e:
-                self._batch_available = False
-                logger.info(f"[BIGG] Batch endpoint unavailable: {e}, using individual calls")
-        
-        # Use batch endpoint if available
-        elif self._batch_available:
-            try:
-                base_url = self._get_base_url()
-                url = f"{base_url}/embedding/bigg/text/batch"
-                data = {"texts": texts}
-                response = requests.post(url, json=data, timeout=self.timeout)
-                response.raise_for_status()
-                result = response.json()
-                embeddings = [np.array(emb, dtype=np.float32) for emb in result["embeddings"]]
-                return np.vstack(embeddings) if embeddings else np.array([])
-            except Exception as e:
-                logger.warning(f"[BIGG] Batch request failed: {e}, falling back to individual calls")
-                self._batch_available = False
+        return get_embedding_cache().get_or_fetch(
+            "bigg", texts, self._fetch_text_embeddings, key_fn=clip_text_key
+        )
 
-        # Fallback: individual requests
-        embeddings = []
-        for text in texts:
-            try:
-                base_url = self._get_base_url()
-                url = f"{base_url}/embedding/bigg/text"
-                data = {"text": text}
-
-                response = requests.post(url, json=data, timeout=self.timeout)
-                response.raise_for_status()
+    def _fetch_text_embeddings(
+        self,
+        texts: Union[str, List[str]]
+    ) -> np.ndarray:
+        """
+        Extract text embeddings from CLIP bigG model.
+        Optimized: uses the batch endpoint (length-sorted mini-batches) if server supports it.
+        """
+        if isinstance(texts, str):
+            texts = [texts]
 
-                result = response.json()
-                emb = np.array(result["embedding"], dtype=np.float32)
-                embeddings.append(emb)
+        if not texts:
+            return np.array([])
 
-            except Exception as e:
-                logger.error(f"Error extracting CLIP bigG text embedding: {e}")
-                return np.array([])
+        # Try batch endpoint (skipped without a request when the server is known not to support it)
+        try:
+            return embed_length_sorted(self._embed_batch, texts)
+        except BatchEndpointUnavailable:
+            pass
+        except Exception as e:
+            # Transient failure: fall back for this call only, retry batch next time
+            logger.warning(f"[BIGG] Batch request failed: {e}, falling back to individual calls")
 
-        return np.vstack(embeddings) if embeddings else np.array([])
+        # Fallback: individual requests, issued concurrently
+        try:
+            return fan_out_rows(self._embed_one_text, texts)
+        except Exception as e:
+            if self.strict:
+                raise
+            logger.error(f"Error extracting CLIP bigG text embedding: {e}")
+            return np.array([])
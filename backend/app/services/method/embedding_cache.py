@@ -0,0 +1,124 @@
+"""
+Two-tier text embedding cache shared by the embedding clients
+- memory: per-process LRU of float32 vectors
+- disk (optional, EMBEDDING_CACHE_DIR): diskcache store shared by all uvicorn workers,
+  vectors kept as float16 bytes to halve the footprint
+"""
+import hashlib
+import logging
+import threading
+from typing import Callable, List, Optional
+
+import numpy as np
+from cachetools import LRUCache
+from diskcache import Cache
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, maxsize: int, directory: Optional[str] = None):
+        self._memory = LRUCache(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self._disk = Cache(directory) if directory else None
+
+    @staticmethod
+    def _key(model_name: str, text: str) -> str:
+        return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            emb = self._memory.get(key)
+        if emb is not None or self._disk is None:
+            return emb
+
+        raw = self._disk.get(key)
+        if raw is None:
+            return None
+        emb = np.frombuffer(raw, dtype=np.float16).astype(np.float32)
+        emb.setflags(write=False)
+        with self._lock:
+            self._memory[key] = emb
+        return emb
+
+    def _put(self, key: str, emb: np.ndarray) -> None:
+        emb = np.array(emb, dtype=np.float32)  # private copy
+        emb.setflags(write=False)
+        with self._lock:
+            self._memory[key] = emb
+        if self._disk is not None:
+            try:
+                self._disk.set(key, emb.astype(np.float16).tobytes())
+            except Exception as e:
+                logger.warning(f"Embedding disk cache write failed: {e}")
+
+    def get_or_fetch(
+        self,
+        model_name: str,
+        texts: List[str],
+        fetch: Callable[[List[str]], np.ndarray],
+        key_fn: Optional[Callable[[str], str]] = None
+    ) -> np.ndarray:
+        """
+        Return (len(texts), dim) embeddings, calling fetch() only for cache misses.
+        fetch must return one row per requested text, or an empty array on failure
+        (in which case an empty array is returned, same as the clients do).
+        key_fn maps a text to its cache key; texts with the same key must embed identically.
+        """
+        keys = [self._key(model_name, key_fn(t) if key_fn else t) for t in texts]
+        cached = [self._get(k) for k in keys]
+
+        # Deduplicate misses (same key within one call): key -> first text with that key
+        misses = {}
+        for i, emb in enumerate(cached):
+            if emb is None:
+                misses.setdefault(keys[i], texts[i])
+
+        if misses:
+            fetched = fetch(list(misses.values()))
+            if fetched is None or fetched.size == 0 or len(fetched) != len(misses):
+                return np.array([])
+
+            by_key = dict(zip(misses, fetched))
+            for key, emb in by_key.items():
+                self._put(key, emb)
+
+            # All misses, no repeats (the usual single-query case): the fetched array
+            # already has the right rows in the right order -> no second (N, dim) copy
+            if len(misses) == len(texts):
+                return np.asarray(fetched, dtype=np.float32)
+
+            for i, emb in enumerate(cached):
+                if emb is None:
+                    cached[i] = by_key[keys[i]]
+
+        out = np.empty((len(texts), cached[0].shape[-1]), dtype=np.float32)
+        for i, emb in enumerate(cached):
+            out[i] = emb
+        return out
+
+
+def clip_text_key(text: str) -> str:
+    """
+    Cache key for open_clip text encoders (CLIP, BigG): their tokenizer collapses
+    whitespace and lowercases, so texts differing only in case/spacing embed identically.
+    """
+    return " ".join(text.split()).lower()
+
+
+_instance: Optional[EmbeddingCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _instance
+    if _instance is None:
+        with _instance_lock:
+            if _instance is None:
+                _instance = EmbeddingCache(
+                    maxsize=settings.EMBEDDING_CACHE_SIZE,
+                    directory=settings.EMBEDDING_CACHE_DIR
+                )
+    return _instance
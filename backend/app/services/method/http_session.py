@@ -0,0 +1,197 @@
+"""
+Shared HTTP session factory for embedding server clients
+Keeps TCP/TLS connections alive between calls instead of reconnecting per request
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar, Union
+
+import httpx
+import numpy as np
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Embedding servers answer this Accept type with raw float16 rows
+# (shape in X-Embedding-Count / X-Embedding-Dim); older servers ignore it and send JSON
+BINARY_EMBEDDING_TYPE = "application/octet-stream"
+
+# Gateway errors retried for idempotent embedding calls
+# (Kaggle/ngrok tunnels return 502/503/504 while a notebook restarts)
+RETRY_STATUSES = (502, 503, 504)
+
+# Texts per request to a /text/batch endpoint
+TEXT_BATCH_SIZE = 32
+
+# Shared pool for per-item fallback requests. It is process-wide, so its size also caps
+# in-flight fallback requests across all embedding clients (protects the servers)
+_fan_out_executor: Optional[ThreadPoolExecutor] = None
+_fan_out_lock = threading.Lock()
+
+
+class BatchEndpointUnavailable(Exception):
+    """Server has no batch endpoint (404/405) -> caller should switch to per-item requests"""
+
+
+class HTTP2Session(httpx.Client):
+    """
+    httpx client speaking HTTP/2 (one multiplexed connection per server, falls back
+    to HTTP/1.1 via ALPN) with the same retry policy as the requests-based session.
+    """
+
+    def __init__(self, pool_connections: int, pool_maxsize: int, retries: int = 3, backoff_factor: float = 0.3):
+        transport = httpx.HTTPTransport(
+            http2=True,
+            retries=retries,  # connection errors
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_connections)
+        )
+        super().__init__(transport=transport)
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+
+    def request(self, *args, **kwargs) -> httpx.Response:
+        # Gateway errors (the transport only retries failed connects)
+        for attempt in range(self._retries + 1):
+            response = super().request(*args, **kwargs)
+            if response.status_code not in RETRY_STATUSES or attempt == self._retries:
+                return response
+            time.sleep(self._backoff_factor * (2 ** attempt))
+
+
+Session = Union[requests.Session, HTTP2Session]
+
+
+def create_session(pool_connections: int = 16, pool_maxsize: int = 64) -> Session:
+    """
+    Create a pooled, keep-alive HTTP session (HTTP/2 via httpx if EMBEDDING_HTTP2).
+
+    Args:
+        pool_connections: Number of per-host pools to cache (one per embedding server URL)
+        pool_maxsize: Max connections kept alive per host (>= concurrent search threads)
+    """
+    if settings.EMBEDDING_HTTP2:
+        session = HTTP2Session(pool_connections, pool_maxsize)
+        session.headers["Accept"] = f"{BINARY_EMBEDDING_TYPE}, application/json;q=0.9"
+        return session
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        # Embedding POSTs are idempotent -> also retry them on gateway errors
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"})
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept"] = f"{BINARY_EMBEDDING_TYPE}, application/json;q=0.9"
+    return session
+
+
+def decode_embeddings(response: Union[requests.Response, httpx.Response]) -> np.ndarray:
+    """(count, dim) float32 embeddings from a binary float16 or a JSON embedding response"""
+    if response.headers.get("Content-Type", "").startswith(BINARY_EMBEDDING_TYPE):
+        dim = int(response.headers["X-Embedding-Dim"])
+        return np.frombuffer(response.content, dtype=np.float16).reshape(-1, dim).astype(np.float32)
+
+    data = orjson.loads(response.content)
+    if "embeddings" in data:
+        # Single (B, dim) float32 allocation straight from the JSON lists
+        return np.asarray(data["embeddings"], dtype=np.float32)
+    return np.asarray(data["embedding"], dtype=np.float32)[np.newaxis, :]
+
+
+def warm_up_async(session: Session, base_urls: List[str], path: str = "/health", timeout: float = 5) -> None:
+    """
+    Open a keep-alive connection to every server in the background
+    (DNS + TCP/TLS handshake) so the first real request doesn't pay for it.
+    Failures are ignored - this is best-effort.
+    """
+    def _warm():
+        for base_url in base_urls:
+            try:
+                session.get(f"{base_url.rstrip('/')}{path}", timeout=timeout)
+            except Exception as e:
+                logger.debug(f"Warm-up of {base_url} failed: {e}")
+
+    threading.Thread(target=_warm, name="http-warmup", daemon=True).start()
+
+
+def _get_fan_out_executor() -> ThreadPoolExecutor:
+    global _fan_out_executor
+    if _fan_out_executor is None:
+        with _fan_out_lock:
+            if _fan_out_executor is None:
+                _fan_out_executor = ThreadPoolExecutor(
+                    max_workers=settings.EMBEDDING_FANOUT_WORKERS, thread_name_prefix="embed-fanout"
+                )
+    return _fan_out_executor
+
+
+def fan_out(fn: Callable[[T], R], items: Sequence[T]) -> List[R]:
+    """
+    Run fn over items concurrently on the shared pool, preserving order.
+    Latency goes from N x RTT to ~ceil(N / EMBEDDING_FANOUT_WORKERS) x RTT for
+    per-item HTTP calls. The first exception raised by fn is re-raised.
+    """
+    if len(items) <= 1:
+        # Common single-query case: no thread hop
+        return [fn(item) for item in items]
+    return list(_get_fan_out_executor().map(fn, items))
+
+
+def fan_out_rows(fn: Callable[[T], np.ndarray], items: Sequence[T]) -> np.ndarray:
+    """
+    fan_out for per-item embedding calls returning one row each.
+    Rows are written into a single preallocated (N, dim) float32 array as they
+    arrive (no list of rows + vstack copy); one item comes back as a (1, dim) view.
+    """
+    if not items:
+        return np.array([])
+    if len(items) == 1:
+        return np.asarray(fn(items[0]), dtype=np.float32).reshape(1, -1)
+
+    out = None
+    for i, row in enumerate(_get_fan_out_executor().map(fn, items)):
+        if out is None:
+            out = np.empty((len(items), row.shape[-1]), dtype=np.float32)
+        out[i] = row
+    return out
+
+
+def embed_length_sorted(
+    fn: Callable[[List[str]], np.ndarray],
+    texts: List[str],
+    batch_size: int = TEXT_BATCH_SIZE
+) -> np.ndarray:
+    """
+    Embed texts through a batch function in length-sorted mini-batches.
+
+    The servers pad each batch to its longest text, so grouping texts of similar
+    length cuts padded tokens. Mini-batches run concurrently via fan_out and rows
+    are scattered back to the original order.
+    """
+    if len(texts) <= batch_size:
+        return fn(texts)
+
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    chunks = [[texts[i] for i in order[s:s + batch_size]] for s in range(0, len(order), batch_size)]
+    results = fan_out(fn, chunks)
+
+    out = np.empty((len(texts), results[0].shape[1]), dtype=np.float32)
+    out[order] = np.concatenate(results)
+    return out
@@ -1,16 +1,18 @@
-import json
 import logging
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 import time
 
 import numpy as np
+import orjson
 import cohere
+from cachetools import TTLCache
 from cohere.errors import TooManyRequestsError
 
 from app.core.config import settings
 from app.services.method.qwen_client import QwenClient
-from app.services.vector_db.qdrant_client import QdrantClient
+from app.services.vector_db.qdrant_client import get_qdrant_client
 from app.utils.mapping import get_keyframe_path
 from app.services.gemini.reset_api_key import APIKeyManager
 
@@ -18,16 +20,21 @@ logger = logging.getLogger(__name__)
 
 
 class ICSearch:
+    # One cohere.Client per API key, reused across calls (keeps its HTTP connection pool)
+    _co_clients: Dict[str, cohere.Client] = {}
+    _co_lock = threading.Lock()
+
     def __init__(self):
         self.qwen = QwenClient()
-        self.qdrant = QdrantClient()
+        self.qdrant = get_qdrant_client()  # Shared gRPC channel
         self.collection = "IC"
 
         ic_path = Path("app/data/index/es_data/IC.json")
         if not ic_path.exists():
             raise FileNotFoundError(f"IC.json not found: {ic_path}")
 
-        self.ic_data = json.loads(ic_path.read_text(encoding="utf-8"))
+        # orjson parses straight from bytes (no decode-to-str copy) and is several times faster than json
+        self.ic_data = orjson.loads(ic_path.read_bytes())
         logger.info(f"IC.json loaded: {len(self.ic_data)} entries")
 
         if not settings.COHERE_API_KEYS:
@@ -35,13 +42,39 @@ class ICSearch:
 
         self.key_manager = APIKeyManager(settings.COHERE_API_KEYS)
 
+        # Final (reranked) results of repeated queries, keyed on (query, top_k)
+        self._cache = TTLCache(maxsize=settings.IC_QUERY_CACHE_SIZE, ttl=settings.IC_QUERY_CACHE_TTL)
+        self._cache_lock = threading.Lock()
+
     def _client(self):
         key = self.key_manager.get_next_key()
-        return cohere.Client(key)
+        client = self._co_clients.get(key)
+        if client is None:
+            with self._co_lock:
+                client = self._co_clients.get(key)
+                if client is None:
+                    client = self._co_clients[key] = cohere.Client(key)
+        return client
+
+    def _cache_get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        with self._cache_lock:
+            cached = self._cache.get(key)
+        # Callers rescale scores in place -> hand out copies
+        return [dict(r) for r in cached] if cached is not None else None
+
+    def _cache_put(self, key: tuple, results: List[Dict[str, Any]]) -> None:
+        with self._cache_lock:
+            self._cache[key] = [dict(r) for r in results]
 
     def search(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
         top_k = top_k or settings.DEFAULT_TOP_K
 
+        # Skips Qwen + Qdrant + Cohere entirely on a repeat
+        cache_key = (query, top_k)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
         emb = self.qwen.extract_text_embedding(query)
         
         # Check if embedding is valid (not empty and has proper shape)
@@ -59,19 +92,24 @@ class ICSearch:
             logger.info("[IC] Qdrant returned 0 results")
             return []
 
-        try:
-            qdrant_debug = ", ".join(
-                f"{r['id']}:{r['score']:.4f}" for r in q_results[:20]
-            )
-            logger.info(f"[IC] Qdrant top results (id:score): {qdrant_debug}")
-        except Exception:
-            pass
+        if logger.isEnabledFor(logging.INFO):
+            try:
+                qdrant_debug = ", ".join(
+                    f"{r['id']}:{r['score']:.4f}" for r in q_results[:20]
+                )
+                logger.info(f"[IC] Qdrant top results (id:score): {qdrant_debug}")
+            except Exception:
+                pass
 
         doc_ids = []
         doc_texts = []
 
         empty_text_ids = []
 
+        # Cohere bills/ranks per document: send each distinct non-empty text once
+        uniq_texts = []
+        text_pos = {}  # text -> index in uniq_texts
+
         for r in q_results:
             rid = str(r["id"])
             text = self.ic_data.get(rid, "")
@@ -79,6 +117,9 @@ class ICSearch:
             # Log empty text
             if not text or text.strip() == "":
                 empty_text_ids.append(rid)
+            elif text not in text_pos:
+                text_pos[text] = len(uniq_texts)
+                uniq_texts.append(text)
 
             doc_ids.append(rid)
             doc_texts.append(text)
@@ -86,6 +127,10 @@ class ICSearch:
         if empty_text_ids:
             logger.warning(f"[IC] EMPTY TEXT FOUND for IDs: {empty_text_ids[:20]} (showing max 20)")
 
+        if not uniq_texts:
+            logger.warning("[IC] No caption text to rerank, using Qdrant results")
+            return self._qdrant_fallback(q_results, top_k)
+
         # Retry logic with exponential backoff for Cohere rate limits
         max_retries = 3
         retry_delay = 2  # Start with 2 seconds
@@ -96,8 +141,8 @@ class ICSearch:
                 rerank = co.rerank(
                     model="rerank-multilingual-v3.0",   
                     query=query,
-                    documents=doc_texts,
-                    top_n=top_k
+                    documents=uniq_texts,
+                    top_n=len(uniq_texts)
                 )
                 break  # Success, exit retry loop
                 
@@ -112,60 +157,68 @@ class ICSearch:
                 else:
                     # Final attempt failed, fallback to Qdrant results only
                     logger.error(f"[IC] Cohere rate limit exceeded after {max_retries} attempts, using Qdrant results as fallback")
-                    return [
-                        {
-                            "id": str(r["id"]),
-                            "score": float(r["score"]),
-                            "text": self.ic_data.get(str(r["id"]), ""),
-                            "method": "ic",
-                            "keyframe_path": get_keyframe_path(str(r["id"]))
-                        }
-                        for r in q_results[:top_k]
-                    ]
+                    return self._qdrant_fallback(q_results, top_k)
                     
             except Exception as e:
                 logger.error(f"[IC] Cohere rerank error: {e}")
                 # Fallback to Qdrant results
-                return [
-                    {
-                        "id": str(r["id"]),
-                        "score": float(r["score"]),
-                        "text": self.ic_data.get(str(r["id"]), ""),
-                        "method": "ic",
-                        "keyframe_path": get_keyframe_path(str(r["id"]))
-                    }
-                    for r in q_results[:top_k]
-                ]
-
-        try:
-            cohere_debug = ", ".join(
-                f"{doc_ids[item.index]}:{item.relevance_score:.4f}"
-                for item in rerank.results[:20]
-            )
-            logger.info(f"[IC] Cohere rerank (id:score): {cohere_debug}")
-        except Exception:
-            pass
+                return self._qdrant_fallback(q_results, top_k)
 
-        final = []
-        for item in rerank.results:
-            idx = item.index
-            rid = doc_ids[idx]
+        if logger.isEnabledFor(logging.INFO):
+            try:
+                cohere_debug = ", ".join(
+                    f"{uniq_texts[item.index][:30]!r}:{item.relevance_score:.4f}"
+                    for item in rerank.results[:20]
+                )
+                logger.info(f"[IC] Cohere rerank (text:score): {cohere_debug}")
+            except Exception:
+                pass
+
+        # Map scores back to every hit sharing the text; empty captions rank last with score 0
+        uniq_scores = {item.index: float(item.relevance_score) for item in rerank.results}
+        scored = []
+        for rid, text in zip(doc_ids, doc_texts):
+            pos = text_pos.get(text)
+            score = uniq_scores.get(pos, 0.0) if pos is not None else 0.0
+            scored.append((score, rid, text))
+        # Stable sort: ties keep Qdrant order
+        scored.sort(key=lambda x: x[0], reverse=True)
 
+        final = []
+        for score, rid, text in scored[:top_k]:
             final.append({
                 "id": rid,
-                "score": float(item.relevance_score),
-                "text": doc_texts[idx],
+                "score": score,
+                "text": text,
                 "method": "ic",
                 "keyframe_path": get_keyframe_path(rid)
             })
 
+        # Only reranked results are cached; Qdrant-only fallbacks are retried next time
+        self._cache_put(cache_key, final)
         return final
 
+    def _qdrant_fallback(self, q_results: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        """Qdrant order/scores when reranking is not possible"""
+        return [
+            {
+                "id": str(r["id"]),
+                "score": float(r["score"]),
+                "text": self.ic_data.get(str(r["id"]), ""),
+                "method": "ic",
+                "keyframe_path": get_keyframe_path(str(r["id"]))
+            }
+            for r in q_results[:top_k]
+        ]
+
 
 _ic_instance = None
+_ic_lock = threading.Lock()
 
 def get_ic_search():
     global _ic_instance
     if _ic_instance is None:
-        _ic_instance = ICSearch()
+        with _ic_lock:
+            if _ic_instance is None:
+                _ic_instance = ICSearch()
     return _ic_instance
@@ -1,15 +1,17 @@
 import numpy as np
 from typing import List, Dict, Any, Optional
 import logging
-from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from app.services.method.clip_client import CLIPClient
 from app.services.method.beit3_client import BEiT3Client
 from app.services.method.bigg_client import BigGClient
-from app.services.vector_db.qdrant_client import QdrantClient
+from app.services.vector_db.qdrant_client import get_qdrant_client
+from app.utils.ensemble import ensemble_z_scores
 from app.utils.scale import ScoreScaler
-from app.utils.mapping import get_keyframe_path
+from app.utils.mapping import get_keyframe_paths
+from app.utils.semantic_cache import SemanticCache
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -18,34 +20,59 @@ logger = logging.getLogger(__name__)
 class MultiModelSearch:
 
     def __init__(self):
-        self.clip_weight = 0.25
-        self.beit3_weight = 0.50
-        self.bigg_weight = 0.25
+        self.clip_weight = settings.SEARCH_ENSEMBLE_WEIGHT_CLIP
+        self.beit3_weight = settings.SEARCH_ENSEMBLE_WEIGHT_BEIT3
+        self.bigg_weight = settings.SEARCH_ENSEMBLE_WEIGHT_BIGG
 
         self.clip_client = CLIPClient()
         self.beit3_client = BEiT3Client()
         self.bigg_client = BigGClient()
-        self.qdrant_client = QdrantClient()
+        self.qdrant_client = get_qdrant_client()  # One gRPC channel per process, shared with other services
 
         self.clip_collection = "clip"
         self.beit3_collection = "beit3"
         self.bigg_collection = "bigg_clip"
 
-    def _extract_embeddings(self, query: str):
-        def wrap(fn):
-            try:
-                emb = fn(query)
-                return emb[0] if emb is not None and emb.size != 0 else None
-            except:
-                return None
-
-        # Use more workers for concurrent embedding extraction
-        with ThreadPoolExecutor(max_workers=6) as ex:
-            clip_f = ex.submit(wrap, self.clip_client.extract_text_embedding)
-            beit3_f = ex.submit(wrap, self.beit3_client.extract_text_embedding)
-            bigg_f = ex.submit(wrap, self.bigg_client.extract_text_embedding)
+        # name -> (client, collection, ensemble weight); this order is the ensemble and result-tuple order
+        self.models = {
+            "clip": (self.clip_client, self.clip_collection, self.clip_weight),
+            "beit3": (self.beit3_client, self.beit3_collection, self.beit3_weight),
+            "bigg": (self.bigg_client, self.bigg_collection, self.bigg_weight),
+        }
+
+        # Ensemble members, fixed once: zero-weight models are never embedded or searched
+        self._active = [(name, client, col, w) for name, (client, col, w) in self.models.items() if w > 0]
+        if not self._active:
+            raise ValueError("At least one SEARCH_ENSEMBLE_WEIGHT_* must be > 0")
+        self._ensemble_weights = [w for _, _, _, w in self._active]
+        # Model embedded in the calling thread (its embedding keys the semantic cache)
+        self._local = "beit3" if self.beit3_weight > 0 else self._active[0][0]
+
+        # Persistent pool for the per-model pipelines (shared by concurrent requests)
+        self._executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix="multimodel")
+
+        # Near-duplicate query cache for ensemble results, keyed by the local model's query embedding
+        self._semantic_cache = None
+        if settings.SEARCH_SEMANTIC_CACHE_THRESHOLD > 0:
+            self._semantic_cache = SemanticCache(
+                maxsize=settings.SEARCH_SEMANTIC_CACHE_SIZE,
+                threshold=settings.SEARCH_SEMANTIC_CACHE_THRESHOLD,
+                ttl=settings.SEARCH_SEMANTIC_CACHE_TTL
+            )
+
+    def _embed(self, client, query: str):
+        """Single query embedding, None on failure"""
+        try:
+            emb = client.extract_text_embedding(query)
+        except Exception:
+            return None
+        if emb is None or emb.size == 0:
+            return None
+        return emb[0]
 
-        return clip_f.result(), beit3_f.result(), bigg_f.result()
+    def _pipeline(self, client, col: str, query: str, top_k: int):
+        """extract -> Qdrant search for one model (runs independently of the others)"""
+        return self._search(self._embed(client, query), col, top_k)
 
     def _search(self, emb, col, top_k):
         if emb is None:
@@ -59,98 +86,148 @@ class MultiModelSearch:
         if top_k is None:
             top_k = settings.DEFAULT_TOP_K
 
-        clip_emb, beit3_emb, bigg_emb = self._extract_embeddings(query)
-
-        # Use more workers for concurrent vector searches
-        with ThreadPoolExecutor(max_workers=6) as ex:
-            clip_f = ex.submit(self._search, clip_emb, self.clip_collection, top_k * 2)
-            beit3_f = ex.submit(self._search, beit3_emb, self.beit3_collection, top_k * 2)
-            bigg_f = ex.submit(self._search, bigg_emb, self.bigg_collection, top_k * 2)
-
-        clip_res = clip_f.result()
-        beit3_res = beit3_f.result()
-        bigg_res = bigg_f.result()
-
-        clip_z = ScoreScaler.z_score_normalize([r["score"] for r in clip_res])
-        beit3_z = ScoreScaler.z_score_normalize([r["score"] for r in beit3_res])
-        bigg_z = ScoreScaler.z_score_normalize([r["score"] for r in bigg_res])
-
-        ensemble = defaultdict(float)
-        meta = {}
-
-        def accumulate(res, zlist, w):
-            for r, z in zip(res, zlist):
-                rid = r["id"]
-                ensemble[rid] += z * w
-                if rid not in meta:
-                    meta[rid] = r.get("payload", {})
-
-        accumulate(clip_res, clip_z, self.clip_weight)
-        accumulate(beit3_res, beit3_z, self.beit3_weight)
-        accumulate(bigg_res, bigg_z, self.bigg_weight)
-
-        ranked = sorted(ensemble.items(), key=lambda x: x[1], reverse=True)[:top_k]
-
-        final_scores = ScoreScaler.min_max_scale([s for _, s in ranked])
-
-        results = []
-        for (rid, _), s in zip(ranked, final_scores):
-            results.append({
-                "id": rid,
-                "score": s,
-                "payload": meta.get(rid, {}),
-                "keyframe_path": get_keyframe_path(rid)
-            })
-        return results
+        if len(self._active) == 1:
+            # z-score + min-max of a single list == min-max of its scores -> no ensemble math
+            return self.search_single_model(query, self._active[0][0], top_k)
+
+        # One end-to-end pipeline per model: a slow embedding server only delays its own search.
+        # The local model (BEiT3 unless disabled) runs in the calling thread
+        futures = {
+            name: self._executor.submit(self._pipeline, client, col, query, top_k * 2)
+            for name, client, col, _ in self._active
+            if name != self._local
+        }
+        local_client, local_col, _ = self.models[self._local]
+        local_emb = self._embed(local_client, query)
+
+        if self._semantic_cache is not None and local_emb is not None:
+            cached = self._semantic_cache.get(local_emb, tag=top_k)
+            if cached is not None:
+                for f in futures.values():
+                    f.cancel()
+                return [dict(r) for r in cached]
+
+        per_model = {self._local: self._search(local_emb, local_col, top_k * 2)}
+        per_model.update((name, f.result()) for name, f in futures.items())
+        result_lists = [per_model[name] for name, _, _, _ in self._active]
+
+        results = ensemble_z_scores(result_lists, self._ensemble_weights, top_k)
+        # ensemble_z_scores already returns fresh {id, score, payload} dicts -> complete them in place
+        paths = get_keyframe_paths([r["id"] for r in results])
+        for r, path in zip(results, paths):
+            r.setdefault("payload", {})
+            r["keyframe_path"] = path
+        final_results = results
+
+        # Only complete ensembles are worth reusing
+        if self._semantic_cache is not None and all(result_lists):
+            self._semantic_cache.put(local_emb, [dict(r) for r in final_results], tag=top_k)
+        return final_results
 
     def search_single_model(self, query: str, model: str, top_k=None):
         if top_k is None:
             top_k = settings.DEFAULT_TOP_K
 
         model = model.lower()
+        if model not in self.models:
+            return []
+        client, col, _ = self.models[model]
         try:
-            if model == "clip":
-                emb_result = self.clip_client.extract_text_embedding(query)
-                if emb_result is None or emb_result.size == 0 or emb_result.shape[0] == 0:
-                    logger.warning(f"[MULTIMODEL] CLIP returned empty embedding for query: {query}")
-                    return []
-                emb = emb_result[0]
-                col = self.clip_collection
-            elif model == "beit3":
-                emb_result = self.beit3_client.extract_text_embedding(query)
-                if emb_result is None or emb_result.size == 0 or emb_result.shape[0] == 0:
-                    logger.warning(f"[MULTIMODEL] BEiT3 returned empty embedding for query: {query}")
-                    return []
-                emb = emb_result[0]
-                col = self.beit3_collection
-            elif model == "bigg":
-                emb_result = self.bigg_client.extract_text_embedding(query)
-                if emb_result is None or emb_result.size == 0 or emb_result.shape[0] == 0:
-                    logger.warning(f"[MULTIMODEL] BIGG returned empty embedding for query: {query}")
-                    return []
-                emb = emb_result[0]
-                col = self.bigg_collection
-            else:
+            emb_result = client.extract_text_embedding(query)
+            if emb_result is None or emb_result.size == 0 or emb_result.shape[0] == 0:
+                logger.warning(f"[MULTIMODEL] {model.upper()} returned empty embedding for query: {query}")
                 return []
+            emb = emb_result[0]
         except Exception as e:
             logger.error(f"[MULTIMODEL] Error extracting embedding for {model}: {e}")
             return []
 
         res = self.qdrant_client.search(col, emb, top_k)
+        return self._scale_results(res)
+
+    @property
+    def ensemble_weights(self) -> List[float]:
+        """Weights in (clip, beit3, bigg) order, matching the search_all_models result tuple"""
+        return [w for _, _, w in self.models.values()]
+
+    @staticmethod
+    def _scale_results(res):
+        """Min-max scaled scores + keyframe paths (single-model output format)"""
         scaled = ScoreScaler.min_max_scale([r["score"] for r in res])
+        paths = get_keyframe_paths([r["id"] for r in res])
 
-        out = []
-        for r, s in zip(res, scaled):
+        for r, s, path in zip(res, scaled, paths):
             r["score"] = s
-            r["keyframe_path"] = get_keyframe_path(r["id"])
-            out.append(r)
-        return out
+            r["keyframe_path"] = path
+        return res
+
+    def _search_model_batch(self, queries: List[str], model: str, top_k: int):
+        """search_single_model for several queries: one embedding request + one Qdrant RPC"""
+        client, col, _ = self.models[model]
+
+        try:
+            embs = client.extract_text_embedding(queries)
+        except Exception as e:
+            logger.error(f"[MULTIMODEL] Error extracting embeddings for {model}: {e}")
+            return [[] for _ in queries]
+        if embs is None or embs.size == 0 or len(embs) != len(queries):
+            logger.warning(f"[MULTIMODEL] {model} returned no embeddings for queries: {queries}")
+            return [[] for _ in queries]
+
+        return [self._scale_results(res) for res in self.qdrant_client.search_batch(col, embs, top_k)]
+
+
+    def search_all_models(self, query: str, top_k=None):
+        """
+        Run search_single_model for every model concurrently.
+        Returns (clip_res, beit3_res, bigg_res); zero-weight models are skipped and give [].
+        """
+        futures = {
+            name: self._executor.submit(self.search_single_model, query, name, top_k)
+            for name, _, _, _ in self._active
+        }
+        return tuple(futures[name].result() if name in futures else [] for name in self.models)
+
+    def submit_all_models_batch(self, queries: List[str], top_k=None) -> List[Future]:
+        """
+        Start search_all_models for several queries at once: per model, one batched
+        embedding request and one Qdrant search_batch RPC instead of one of each per query.
+        Returns futures for (clip, beit3, bigg), each resolving to one result list per
+        query (query order); zero-weight models resolve to empty lists right away.
+        The per-model jobs never wait on each other, so callers may block on the
+        futures from any thread.
+        """
+        if top_k is None:
+            top_k = settings.DEFAULT_TOP_K
+        active = {name for name, _, _, _ in self._active}
+        futures = []
+        for name in self.models:
+            if name in active:
+                futures.append(self._executor.submit(self._search_model_batch, queries, name, top_k))
+            else:
+                skipped = Future()
+                skipped.set_result([[] for _ in queries])
+                futures.append(skipped)
+        return futures
 
+    def close(self):
+        """Stop the pipeline pool (app shutdown); in-flight searches still finish"""
+        self._executor.shutdown(wait=False)
 
 _instance = None
+_instance_lock = threading.Lock()
 
 def get_multimodel_search():
     global _instance
     if _instance is None:
-        _instance = MultiModelSearch()
+        with _instance_lock:
+            if _instance is None:
+                _instance = MultiModelSearch()
     return _instance
+
+def close_multimodel_search():
+    global _instance
+    with _instance_lock:
+        if _instance is not None:
+            _instance.close()
+            _instance = None
@@ -1,40 +1,70 @@
 import logging
-from typing import List
-from elasticsearch import Elasticsearch
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, Optional, Set
+from elasticsearch import helpers
 from app.core.config import settings
+from app.services.elastic_search.client import get_es_client
 
 logger = logging.getLogger(__name__)
 
+_NO_IDS: FrozenSet[str] = frozenset()
+
 
 class ObjectFilterSearch:
+    # In-memory inverted index {object: ids} over the object index, shared by all instances.
+    # Built/refreshed in a background thread; until the first build finishes, filter() queries ES
+    _inverted: Optional[Dict[str, FrozenSet[str]]] = None
+    _built_at: float = 0.0
+    _building = False
+    _index_lock = threading.Lock()
+
     def __init__(self):
-        self.host = settings.ELASTICSEARCH_HOST or "localhost"
-        self.port = settings.ELASTICSEARCH_PORT or 9200
-
-        es_url = f"http://{self.host}:{self.port}"
-
-        config = {
-            "hosts": [es_url],
-            "request_timeout": settings.ELASTICSEARCH_REQUEST_TIMEOUT,
-            "max_retries": settings.ELASTICSEARCH_MAX_RETRIES,
-            "retry_on_timeout": settings.ELASTICSEARCH_RETRY_ON_TIMEOUT,
-        }
-
-        if settings.ELASTICSEARCH_USER and settings.ELASTICSEARCH_PASSWORD:
-            config["basic_auth"] = (
-                settings.ELASTICSEARCH_USER,
-                settings.ELASTICSEARCH_PASSWORD,
-            )
+        self.client = get_es_client()
+        self.index_name = "object"
 
+    def _build_inverted_index(self) -> None:
         try:
-            self.client = Elasticsearch(**config)
-            self.client.info()
-            logger.info("ObjectFilterSearch connected to Elasticsearch")
+            start = time.perf_counter()
+            postings: Dict[str, Set[str]] = defaultdict(set)
+            for hit in helpers.scan(
+                self.client,
+                index=self.index_name,
+                query={"query": {"match_all": {}}},
+                _source=["objects"],
+                size=5000
+            ):
+                for obj in hit.get("_source", {}).get("objects") or []:
+                    postings[obj].add(hit["_id"])
+
+            ObjectFilterSearch._inverted = {obj: frozenset(ids) for obj, ids in postings.items()}
+            ObjectFilterSearch._built_at = time.monotonic()
+            logger.info(
+                f"[ObjectFilter] Inverted index built: {len(postings)} objects "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
         except Exception as e:
-            logger.error(f"ObjectFilterSearch init failed: {e}")
-            raise
-
-        self.index_name = "object"
+            logger.error(f"[ObjectFilter] Inverted index build failed: {e}")
+        finally:
+            with ObjectFilterSearch._index_lock:
+                ObjectFilterSearch._building = False
+
+    def _get_inverted_index(self) -> Optional[Dict[str, FrozenSet[str]]]:
+        """Current inverted index (None if not built yet); starts a background (re)build when stale"""
+        refresh = settings.ELASTICSEARCH_OBJECT_INDEX_REFRESH
+        if not refresh or refresh <= 0:
+            return None
+
+        inverted = ObjectFilterSearch._inverted
+        if inverted is None or time.monotonic() - ObjectFilterSearch._built_at > refresh:
+            with ObjectFilterSearch._index_lock:
+                if not ObjectFilterSearch._building:
+                    ObjectFilterSearch._building = True
+                    threading.Thread(
+                        target=self._build_inverted_index, name="object-index", daemon=True
+                    ).start()
+        return inverted
 
     def filter(self, ids: List[str], selected_objects: List[str]) -> List[str]:
 
@@ -45,6 +75,19 @@ class ObjectFilterSearch:
         if not ids:
             return ids
 
+        inverted = self._get_inverted_index()
+        if inverted is not None:
+            # Local set intersection instead of an ES round-trip; keeps the input order
+            keep = set(ids)
+            for obj in selected_objects:
+                keep &= inverted.get(obj, _NO_IDS)
+                if not keep:
+                    break
+            final_ids = [i for i in ids if i in keep]
+
+            logger.info(f"Object filter (in-memory): {len(ids)} → {len(final_ids)} results")
+            return final_ids
+
         try:
             # Use Elasticsearch query to filter server-side (much more scalable)
             # This is faster than mget() + client-side filtering for large datasets
@@ -61,11 +104,12 @@ class ObjectFilterSearch:
                 index=self.index_name,
                 query=query,
                 _source=False,  # Don't fetch document content, just IDs
-                size=len(ids)   # Max results = input size
+                size=len(ids),  # Max results = input size
+                filter_path=["hits.hits._id"]  # Only the IDs go over the wire
             )
 
-            # Extract IDs from search hits
-            final_ids = [hit["_id"] for hit in response["hits"]["hits"]]
+            # Extract IDs from search hits (no match -> filtered response is {})
+            final_ids = [hit["_id"] for hit in response.get("hits", {}).get("hits", [])]
             
             logger.info(f"Object filter: {len(ids)} → {len(final_ids)} results")
             return final_ids
@@ -74,10 +118,3 @@ class ObjectFilterSearch:
             logger.error(f"[ObjectFilter] Search query failed: {e}")
             # Fallback to original IDs if error
             return ids
-
-        logger.info(
-            f"[ObjectFilter] Before: {len(ids)} → After filter: {len(final_ids)} "
-            f"(selected={selected_objects})"
-        )
-
-        return final_ids
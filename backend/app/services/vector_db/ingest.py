@@ -3,21 +3,32 @@ Ingest .bin files into Qdrant collections
 Creates collections with names matching .bin filenames and uploads vectors in batches
 Optimized for fast ingestion using large batch sizes and efficient numpy operations
 """
+import multiprocessing
 import os
+import queue
+import threading
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional, TypeVar
 import logging
 from tqdm import tqdm
 import time
 import faiss
 
 from app.core.config import settings
-from app.services.vector_db.qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams, PointStruct
+from app.services.vector_db.qdrant_client import QdrantClient, get_qdrant_client
+from qdrant_client.models import (
+    Distance, OptimizersConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, VectorParams
+)
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Qdrant's default indexing_threshold (kB of vectors per segment before HNSW is built)
+INDEXING_THRESHOLD = 20000
+
 
 def load_bin_file(bin_path: Path) -> np.ndarray:
     """Load .bin file as numpy array"""
@@ -30,10 +41,15 @@ def load_bin_file(bin_path: Path) -> np.ndarray:
         raise
 
 
-def load_faiss_index(bin_path: Path):
-    """Load faiss index from .bin file"""
+# Map the index file instead of reading it into RAM: vectors are paged in as batches are read.
+# IO_FLAG_MMAP_IFC (flat indexes) only exists in newer faiss; older versions read flat indexes fully
+MMAP_IO_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def load_faiss_index(bin_path: Path, io_flags: int = 0):
+    """Load faiss index from .bin file (io_flags e.g. MMAP_IO_FLAGS)"""
     try:
-        index = faiss.read_index(str(bin_path))
+        index = faiss.read_index(str(bin_path), io_flags)
         return index
     except Exception as e:
         logger.error(f"❌ Failed to load faiss index from {bin_path}: {e}")
@@ -53,13 +69,94 @@ def get_vector_shape(data: np.ndarray, vector_size: int) -> tuple:
     return (num_vectors, vector_size)
 
 
+def flat_index_view(index) -> Optional[np.ndarray]:
+    """Zero-copy (ntotal, d) float32 view of a flat faiss index's vectors, None for other index types"""
+    if not isinstance(index, faiss.IndexFlat):
+        return None
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+
+def iter_index_chunks(index, start: int, end: int, chunk_size: int) -> Iterator[List[List[float]]]:
+    """Yield L2-normalized vectors start..end-1 of a faiss index as lists of chunk_size vectors"""
+    view = flat_index_view(index)
+    for chunk_start in range(start, end, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, end)
+        if view is not None:
+            # Writable copy of the (read-only, mmapped) batch for the in-place normalization
+            chunk = np.array(view[chunk_start:chunk_end])
+        else:
+            chunk = index.reconstruct_n(chunk_start, chunk_end - chunk_start)
+        # Unit length once here -> collections use DOT, Qdrant skips per-vector cosine normalization
+        faiss.normalize_L2(chunk)
+        # The gRPC uploader only accepts plain lists (RestToGrpc.convert_vector_struct):
+        # one tolist() per chunk is the only per-vector conversion left
+        yield chunk.tolist()
+
+
+def prefetch(items: Iterable[T], depth: int = 4) -> Iterator[T]:
+    """
+    Iterate items produced by a background thread, up to depth items ahead of the consumer.
+    Exceptions from the producer are re-raised in the consumer.
+    """
+    q: queue.Queue = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in items:
+                while not stop.is_set():
+                    try:
+                        q.put((True, item), timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            q.put((False, None))
+        except Exception as e:
+            q.put((False, e))
+
+    threading.Thread(target=produce, name="ingest-prefetch", daemon=True).start()
+    try:
+        while True:
+            ok, item = q.get()
+            if not ok:
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        stop.set()
+
+
+def iter_index_vectors(index, start: int, end: int, chunk_size: int) -> Iterator[List[float]]:
+    """
+    Yield L2-normalized vectors start..end-1 of a faiss index.
+    Chunks are read + normalized in a background thread while the current one uploads.
+    """
+    for chunk in prefetch(iter_index_chunks(index, start, end, chunk_size)):
+        yield from chunk
+
+
+def enable_indexing(qdrant_client: QdrantClient, collection_name: str) -> None:
+    """Restore the default indexing threshold; Qdrant builds the HNSW index in the background"""
+    qdrant_client.client.update_collection(
+        collection_name=collection_name,
+        optimizers_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
+    )
+    logger.info(f"🔧 Indexing enabled for {collection_name} (HNSW build runs in the background)")
+
+
 def ingest_collection(
     qdrant_client: QdrantClient,
     collection_name: str,
     bin_path: Path,
     vector_size: int,
     batch_size: int = 100,
-    distance: Distance = Distance.COSINE
+    distance: Distance = Distance.DOT,
+    parallel: int = 1,
+    progress_position: int = 0,
+    index=None
 ) -> None:
     """
     Ingest a single .bin file (faiss index) into Qdrant collection
@@ -71,14 +168,18 @@ def ingest_collection(
         bin_path: Path to .bin file (faiss IndexFlatIP)
         vector_size: Size of each vector (dimensions)
         batch_size: Batch size for uploading vectors
-        distance: Distance metric for collection (default: COSINE)
+        distance: Distance metric for collection (default: DOT on the pre-normalized vectors = cosine)
+        parallel: Upload worker processes (qdrant-client upload_collection)
+        progress_position: tqdm line (one per collection ingested concurrently)
+        index: Already loaded faiss index for bin_path (skips loading it again)
     """
     logger.info(f"🚀 Starting ingestion for {collection_name}...")
     start_time = time.time()
     
     # Load faiss index (only metadata, not vectors into RAM)
-    logger.info(f"📂 Loading faiss index metadata from {bin_path}...")
-    index = load_faiss_index(bin_path)
+    if index is None:
+        logger.info(f"📂 Loading faiss index metadata from {bin_path}...")
+        index = load_faiss_index(bin_path, MMAP_IO_FLAGS)
     
     # Get vector info from index
     num_vectors = index.ntotal
@@ -107,6 +208,8 @@ def ingest_collection(
             logger.info(f"📊 Collection {collection_name} exists with {existing_count}/{num_vectors} vectors")
             if existing_count >= num_vectors:
                 logger.info(f"✅ Collection {collection_name} already fully populated, skipping")
+                # An interrupted run may have left indexing disabled
+                enable_indexing(qdrant_client, collection_name)
                 return
             else:
                 logger.info(f"📤 Resuming upload from vector {existing_count}")
@@ -115,71 +218,119 @@ def ingest_collection(
             logger.info(f"📦 Collection exists, will attempt to continue upload")
     else:
         logger.info(f"📦 Creating collection: {collection_name} (distance={distance})")
+        # int8 copies of the vectors kept in RAM: 4x less memory traffic per search,
+        # the original float32 vectors are only read to rescore the top candidates
+        quantization_config = (
+            ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+            if settings.QDRANT_SCALAR_QUANTIZATION else None
+        )
         qdrant_client.client.create_collection(
             collection_name=collection_name,
             vectors_config=VectorParams(
                 size=vector_size,
-                distance=distance
-            )
+                distance=distance,
+                # Original float32 vectors mmapped from disk; with quantization they are only read to rescore
+                on_disk=settings.QDRANT_VECTORS_ON_DISK
+            ),
+            quantization_config=quantization_config,
+            # No HNSW build while bulk loading (plain append to segments), enabled after the upload
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=0)
         )
     
-    # Upload vectors in batches (memory efficient - load batch, upload, release memory)
-    logger.info(f"🚀 Uploading {num_vectors} vectors in batches of {batch_size}...")
+    # Stream vectors from the index (one batch reconstructed at a time) into upload_collection:
+    # batching + gRPC upserts run in `parallel` worker processes
+    logger.info(f"🚀 Uploading {num_vectors} vectors in batches of {batch_size} with {parallel} workers...")
     
-    total_batches = (num_vectors + batch_size - 1) // batch_size
+    with tqdm(total=num_vectors, desc=f"Uploading {collection_name}", unit="vectors", position=progress_position) as pbar:
+        def vectors():
+            # Progress = vectors handed to the uploader
+            for vector in iter_index_vectors(index, 0, num_vectors, batch_size):
+                pbar.update(1)
+                yield vector
+        
+        try:
+            qdrant_client.client.upload_collection(
+                collection_name=collection_name,
+                vectors=vectors(),
+                ids=range(num_vectors),
+                batch_size=batch_size,
+                parallel=parallel
+            )
+        except Exception as e:
+            logger.error(f"❌ Failed to upload {collection_name}: {e}")
+            raise
     
-    # Process in chunks to avoid memory issues
-    with tqdm(total=num_vectors, desc=f"Uploading {collection_name}", unit="vectors") as pbar:
-        for batch_idx in range(total_batches):
-            start_idx = batch_idx * batch_size
-            end_idx = min(start_idx + batch_size, num_vectors)
-            
-            try:
-                # Load ONLY this batch from disk (memory efficient)
-                batch_count = end_idx - start_idx
-                batch_vectors = index.reconstruct_n(start_idx, batch_count)
-                
-                # Convert numpy array to list
-                if isinstance(batch_vectors, np.ndarray):
-                    batch_vectors = batch_vectors.tolist()
-                
-                # Create points for this batch
-                points = [
-                    PointStruct(
-                        id=start_idx + i,
-                        vector=vector,
-                        payload=None
-                    )
-                    for i, vector in enumerate(batch_vectors)
-                ]
-                
-                # Upload batch
-                qdrant_client.client.upsert(
-                    collection_name=collection_name,
-                    points=points
-                )
-                
-                # Clear batch from memory
-                del batch_vectors
-                del points
-                
-                pbar.update(batch_count)
-                
-                # Log progress every 100 batches
-                if (batch_idx + 1) % 100 == 0:
-                    elapsed = time.time() - start_time
-                    vectors_done = end_idx
-                    speed = vectors_done / elapsed if elapsed > 0 else 0
-                    logger.info(f"📊 Progress: {vectors_done}/{num_vectors} vectors ({speed:.1f} vec/s)")
-                    
-            except Exception as e:
-                logger.error(f"❌ Failed to process batch {batch_idx} (vectors {start_idx}-{end_idx}): {e}")
-                raise
+    enable_indexing(qdrant_client, collection_name)
     
     elapsed_time = time.time() - start_time
     logger.info(f"✅ Completed {collection_name}: {num_vectors} vectors in {elapsed_time:.2f}s ({num_vectors/elapsed_time:.1f} vectors/s)")
 
 
+def _ingest_one(bin_file: Path, batch_size: int, parallel: int, position: int = 0) -> str:
+    """
+    Detect the vector size of one .bin file and ingest it into its collection.
+    In a worker process this opens the process's own gRPC channel (channels are not fork-safe).
+    """
+    # Collection name = filename without extension
+    collection_name = bin_file.stem
+    
+    # Detect vector size from faiss index (loaded once, reused for the upload)
+    index = None
+    current_vector_size = settings.VECTOR_SIZE
+    if current_vector_size is None:
+        # Load faiss index to get vector size
+        try:
+            index = load_faiss_index(bin_file, MMAP_IO_FLAGS)
+            current_vector_size = index.d
+            num_vectors = index.ntotal
+            logger.info(f"✅ Detected via faiss: vector_size={current_vector_size}, num_vectors={num_vectors} for {collection_name}")
+        except Exception as e:
+            logger.warning(f"⚠️  Could not read as faiss index, trying fallback method: {e}")
+            # Fallback: raw float32 blob -> element count from the file size (no read), try common vector sizes
+            total_elements = bin_file.stat().st_size // np.dtype(np.float32).itemsize
+    
+            # Try common vector sizes
+            for common_size in [768, 1024, 1536, 2048, 384, 512, 256, 128, 4096, 5120, 6400]:
+                if total_elements % common_size == 0:
+                    num_vectors = total_elements // common_size
+                    if num_vectors > 0 and num_vectors < 10000000:
+                        current_vector_size = common_size
+                        logger.info(f"🔍 Detected vector size: {current_vector_size} for {collection_name} ({num_vectors} vectors)")
+                        break
+    
+            if current_vector_size is None:
+                raise ValueError(f"Cannot determine vector size for {collection_name}. File has {total_elements} elements. Please set VECTOR_SIZE in settings.")
+    
+    try:
+        ingest_collection(
+            qdrant_client=get_qdrant_client(),
+            collection_name=collection_name,
+            bin_path=bin_file,
+            vector_size=current_vector_size,
+            batch_size=batch_size,
+            distance=Distance.DOT,
+            parallel=parallel,
+            progress_position=position,
+            index=index
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to ingest {collection_name}: {e}")
+        raise
+    finally:
+        # Release the index (and its mapping) before the next file
+        del index
+    return collection_name
+
+
+def _init_worker() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+
 def main():
     """Main ingestion function"""
     # Setup paths
@@ -205,7 +356,7 @@ def main():
     
     for attempt in range(max_retries):
         try:
-            qdrant_client = QdrantClient()
+            qdrant_client = get_qdrant_client()
             logger.info("✅ Connected to Qdrant")
             break
         except Exception as e:
@@ -220,60 +371,42 @@ def main():
     if qdrant_client is None:
         raise RuntimeError("Failed to initialize Qdrant client")
     
-    # Get batch size from settings - use smaller batch for large files
-    batch_size = 50  # Reduced to avoid OOM with large files like IC.bin (11GB)
-    logger.info(f"⚙️  Using batch size: {batch_size} (optimized for large files)")
-    
-    # Get vector size from settings or use default
-    # You may need to configure this per collection or detect from first file
-    vector_size = settings.VECTOR_SIZE
+    # Vectors are streamed one batch at a time, so large files like IC.bin (11GB) never sit in RAM
+    batch_size = settings.QDRANT_BATCH_SIZE
+    parallel = settings.QDRANT_UPLOAD_WORKERS or max(1, (os.cpu_count() or 2) // 2)
+    logger.info(f"⚙️  Using batch size: {batch_size}, upload workers: {parallel}")
     
     # Ingest each .bin file
     total_start_time = time.time()
     
-    for bin_file in bin_files:
-        # Collection name = filename without extension
-        collection_name = bin_file.stem
-        
-        # Detect vector size from faiss index
-        current_vector_size = vector_size
-        if current_vector_size is None:
-            # Load faiss index to get vector size
-            try:
-                index = load_faiss_index(bin_file)
-                current_vector_size = index.d
-                num_vectors = index.ntotal
-                logger.info(f"✅ Detected via faiss: vector_size={current_vector_size}, num_vectors={num_vectors} for {collection_name}")
-            except Exception as e:
-                logger.warning(f"⚠️  Could not read as faiss index, trying fallback method: {e}")
-                # Fallback: Load file and try common vector sizes
-                data = load_bin_file(bin_file)
-                total_elements = len(data)
-                
-                # Try common vector sizes
-                for common_size in [768, 1024, 1536, 2048, 384, 512, 256, 128, 4096, 5120, 6400]:
-                    if total_elements % common_size == 0:
-                        num_vectors = total_elements // common_size
-                        if num_vectors > 0 and num_vectors < 10000000:
-                            current_vector_size = common_size
-                            logger.info(f"🔍 Detected vector size: {current_vector_size} for {collection_name} ({num_vectors} vectors)")
-                            break
-                
-                if current_vector_size is None:
-                    raise ValueError(f"Cannot determine vector size for {collection_name}. File has {total_elements} elements. Please set VECTOR_SIZE in settings.")
-        
-        try:
-            ingest_collection(
-                qdrant_client=qdrant_client,
-                collection_name=collection_name,
-                bin_path=bin_file,
-                vector_size=current_vector_size,
-                batch_size=batch_size,
-                distance=Distance.COSINE
-            )
-        except Exception as e:
-            logger.error(f"❌ Failed to ingest {collection_name}: {e}")
-            raise
+    ingest_workers = max(1, min(len(bin_files), settings.QDRANT_INGEST_WORKERS))
+    # Split the upload processes between the collections ingested at the same time
+    parallel = max(1, parallel // ingest_workers)
+    logger.info(f"⚙️  Ingesting {ingest_workers} collection(s) at a time, {parallel} upload workers each")
+    
+    if ingest_workers == 1:
+        for bin_file in bin_files:
+            _ingest_one(bin_file, batch_size, parallel)
+    else:
+        # spawn: the workers must not inherit this process's gRPC channel
+        with ProcessPoolExecutor(
+            max_workers=ingest_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        ) as executor:
+            futures = {
+                executor.submit(_ingest_one, bin_file, batch_size, parallel, i % ingest_workers): bin_file
+                for i, bin_file in enumerate(bin_files)
+            }
+            failed = []
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"❌ Failed to ingest {futures[future].stem}: {e}")
+                    failed.append(futures[future].stem)
+            if failed:
+                raise RuntimeError(f"Ingestion failed for: {failed}")
     
     total_elapsed = time.time() - total_start_time
     logger.info(f"🎉 All collections ingested in {total_elapsed:.2f}s")
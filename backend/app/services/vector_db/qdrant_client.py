@@ -1,14 +1,46 @@
 from qdrant_client import QdrantClient as QdrantSDKClient, grpc
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from qdrant_client.models import (
+    Filter, FieldCondition, MatchValue, QuantizationSearchParams, SearchParams, SearchRequest
+)
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import numpy as np
+import orjson
 import logging
+import os
+import threading
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
 
+# Filter keys meant for Elasticsearch (ignored here) / marking a filter already in Qdrant format
+_ES_FILTER_KEYS = frozenset({"objectFilter", "selectedObjects"})
+_QDRANT_FILTER_KEYS = frozenset({"must", "should", "must_not"})
+
+
+@lru_cache(maxsize=1024)
+def _parse_filter(key: bytes) -> Optional[Filter]:
+    """Filter from its canonical JSON (memoized: pydantic validation once per distinct filter)"""
+    try:
+        return Filter(**orjson.loads(key))
+    except Exception as e:
+        logger.warning(f"Invalid Qdrant filter format: {e}")
+        return None
+
+
+def _unit_rows(vectors) -> List[List[float]]:
+    """
+    L2-normalized float32 rows as lists. Collections are ingested pre-normalized with DOT
+    distance, so dot == cosine only if queries are unit length too (no-op for COSINE ones).
+    """
+    v = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(v, axis=1, keepdims=True)
+    np.divide(v, norms, out=v, where=norms > 0)
+    return v.tolist()
+
+
 class QdrantClient:
     """Qdrant client wrapper with gRPC only - simplified for search only"""
     
@@ -25,6 +57,19 @@ class QdrantClient:
         self.api_key = api_key or settings.QDRANT_API_KEY
         self.timeout = timeout or settings.QDRANT_TIMEOUT
         
+        # HNSW search beam width (None = Qdrant default). Qdrant uses max(hnsw_ef, limit)
+        hnsw_ef = settings.QDRANT_HNSW_EF or None
+        # Quantized collections: search the int8 vectors, rescore the oversampled
+        # candidates with the original ones (ignored by collections without quantization)
+        quantization = (
+            QuantizationSearchParams(rescore=True, oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING)
+            if settings.QDRANT_SCALAR_QUANTIZATION else None
+        )
+        self.search_params = (
+            SearchParams(hnsw_ef=hnsw_ef, quantization=quantization)
+            if hnsw_ef or quantization else None
+        )
+        
         self._client = None
         self._connect()
     
@@ -61,19 +106,25 @@ class QdrantClient:
         if not filter_dict:
             return None
         
-        # Remove Elasticsearch-specific filters (objectFilter, selectedObjects)
-        # These are only used for Elasticsearch text search, not Qdrant vector search
-        if 'objectFilter' in filter_dict or 'selectedObjects' in filter_dict:
-            logger.debug("Ignoring Elasticsearch filters (objectFilter, selectedObjects) - not applicable to Qdrant")
-            # Remove these keys and check if any valid Qdrant filters remain
-            filter_dict = {k: v for k, v in filter_dict.items() 
-                          if k not in ['objectFilter', 'selectedObjects']}
-            if not filter_dict:
-                return None
+        # Ignore Elasticsearch-specific filters (objectFilter, selectedObjects):
+        # they are only used for Elasticsearch text search, not Qdrant vector search.
+        # Key-set checks only - no dict copy unless a Qdrant filter is actually parsed
+        keys = filter_dict.keys() - _ES_FILTER_KEYS
+        if not keys:
+            return None
         
         # If filter already contains Qdrant-specific keys (must, should, must_not), 
         # assume it's already in Qdrant format
-        if any(key in filter_dict for key in ['must', 'should', 'must_not']):
+        if not keys.isdisjoint(_QDRANT_FILTER_KEYS):
+            if len(keys) != len(filter_dict):
+                filter_dict = {k: filter_dict[k] for k in keys}
+            try:
+                cache_key = orjson.dumps(filter_dict, option=orjson.OPT_SORT_KEYS)
+            except TypeError:
+                # Not JSON-serializable (e.g. already-built conditions) -> parse uncached
+                cache_key = None
+            if cache_key is not None:
+                return _parse_filter(cache_key)
             try:
                 return Filter(**filter_dict)
             except Exception as e:
@@ -83,6 +134,17 @@ class QdrantClient:
         # If filter is empty or doesn't match any known format, return None
         return None
     
+    @staticmethod
+    def _format_results(results) -> List[Dict[str, Any]]:
+        return [
+            {
+                "id": result.id,
+                "score": result.score,
+                "payload": result.payload or {}
+            }
+            for result in results
+        ]
+    
     def search(
         self,
         collection_name: str,
@@ -93,9 +155,7 @@ class QdrantClient:
     ) -> List[Dict[str, Any]]:
 
         try:
-            # Convert numpy array to list if needed
-            if isinstance(query_vector, np.ndarray):
-                query_vector = query_vector.tolist()
+            query_vector = _unit_rows(query_vector)[0]
             
             # Convert filter to Qdrant Filter format
             qdrant_filter = self._convert_filter(filter)
@@ -105,30 +165,74 @@ class QdrantClient:
                 query_vector=query_vector,
                 limit=top_k,
                 query_filter=qdrant_filter,
+                search_params=self.search_params,
                 score_threshold=score_threshold
             )
             
-            formatted_results = []
-            for result in results:
-                formatted_results.append({
-                    "id": result.id,
-                    "score": result.score,
-                    "payload": result.payload or {}
-                })
+            formatted_results = self._format_results(results)
             
             logger.debug(f"✅ Found {len(formatted_results)} results in {collection_name}")
             return formatted_results
         except Exception as e:
             logger.error(f"❌ Search failed in {collection_name}: {e}")
             raise
+    
+    def search_batch(
+        self,
+        collection_name: str,
+        query_vectors: List[List[float]] | np.ndarray,
+        top_k: int = 10,
+        filter: Optional[Dict[str, Any]] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Several searches in one collection with a single RPC.
+        Returns one result list per query vector (same order, same format as search()).
+        """
+        try:
+            query_vectors = _unit_rows(query_vectors)
+            
+            qdrant_filter = self._convert_filter(filter)
+            requests = [
+                SearchRequest(
+                    vector=vector,
+                    limit=top_k,
+                    filter=qdrant_filter,
+                    params=self.search_params,
+                    score_threshold=score_threshold,
+                    with_payload=True
+                )
+                for vector in query_vectors
+            ]
+            
+            batch_results = self.client.search_batch(collection_name=collection_name, requests=requests)
+            
+            logger.debug(f"✅ Batch of {len(requests)} searches in {collection_name}")
+            return [self._format_results(results) for results in batch_results]
+        except Exception as e:
+            logger.error(f"❌ Batch search failed in {collection_name}: {e}")
+            raise
 
 
 # Singleton instance
 _qdrant_client = None
+_qdrant_lock = threading.Lock()
 
 def get_qdrant_client() -> QdrantClient:
     """Get singleton Qdrant client instance"""
     global _qdrant_client
     if _qdrant_client is None:
-        _qdrant_client = QdrantClient()
+        with _qdrant_lock:
+            if _qdrant_client is None:
+                _qdrant_client = QdrantClient()
     return _qdrant_client
+
+
+def _reset_after_fork() -> None:
+    # A gRPC channel must not be used across fork: the child opens its own on first use
+    global _qdrant_client, _qdrant_lock
+    _qdrant_client = None
+    _qdrant_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,160 @@
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# Above this many results, integer IDs are indexed with np.unique instead of a dict loop
+_VECTORIZED_INDEX_MIN = 1024
+
+
+def _index_ids(
+    result_lists: Sequence[List[Dict[str, Any]]]
+) -> Tuple[List[Dict[str, Any]], List[np.ndarray]]:
+    """
+    Map result IDs to dense indices in first-seen order.
+
+    Returns (firsts, idx_lists): firsts[i] is the first result dict seen for the
+    i-th unique ID, idx_lists[n][j] the index of result_lists[n][j].
+    """
+    if sum(len(res) for res in result_lists) > _VECTORIZED_INDEX_MIN:
+        indexed = _index_int_ids(result_lists)
+        if indexed is not None:
+            return indexed
+
+    id2idx: Dict[Any, int] = {}
+    firsts: List[Dict[str, Any]] = []
+    idx_lists = []
+    for res in result_lists:
+        idx = np.empty(len(res), dtype=np.int64)
+        for j, r in enumerate(res):
+            k = id2idx.get(r["id"])
+            if k is None:
+                k = id2idx[r["id"]] = len(firsts)
+                firsts.append(r)
+            idx[j] = k
+        idx_lists.append(idx)
+    return firsts, idx_lists
+
+
+def _index_int_ids(
+    result_lists: Sequence[List[Dict[str, Any]]]
+) -> Optional[Tuple[List[Dict[str, Any]], List[np.ndarray]]]:
+    """_index_ids via np.unique for all-int IDs (Qdrant point IDs); None if any ID is not an int"""
+    flat = [r for res in result_lists for r in res]
+    ids = [r["id"] for r in flat]
+    if not all(type(i) is int for i in ids):
+        return None
+
+    uniq, first_pos, inverse = np.unique(np.array(ids, dtype=np.int64), return_index=True, return_inverse=True)
+    # np.unique is sorted by ID -> renumber unique IDs by first occurrence
+    order = np.argsort(first_pos, kind="stable")
+    rank = np.empty(uniq.size, dtype=np.int64)
+    rank[order] = np.arange(uniq.size)
+    flat_idx = rank[inverse.ravel()]
+
+    firsts = [flat[i] for i in first_pos[order].tolist()]
+    bounds = np.cumsum([len(res) for res in result_lists])[:-1]
+    return firsts, np.split(flat_idx, bounds)
+
+
+def fuse_z_scores(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    weights: Sequence[float]
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """
+    Weighted sum of per-list z-scores over the union of result IDs.
+
+    Returns (firsts, fused): firsts[i] is the first result dict seen for the
+    i-th unique ID (first-seen order), fused[i] its combined score.
+    """
+    firsts, idx_lists = _index_ids(result_lists)
+
+    fused = np.zeros(len(firsts), dtype=np.float64)
+    for res, idx, w in zip(result_lists, idx_lists, weights):
+        if not res:
+            continue
+        scores = np.fromiter((r["score"] for r in res), dtype=np.float64, count=len(res))
+        std = scores.std()
+        if std == 0:
+            # Same as ScoreScaler.z_score_normalize: constant scores contribute 0
+            continue
+        np.add.at(fused, idx, (scores - scores.mean()) / std * w)
+
+    return firsts, fused
+
+
+def fuse_weighted(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    weights: Sequence[float]
+) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """Weighted sum of raw (already scaled) scores over the union of result IDs, same layout as fuse_z_scores"""
+    firsts, idx_lists = _index_ids(result_lists)
+
+    fused = np.zeros(len(firsts), dtype=np.float64)
+    for res, idx, w in zip(result_lists, idx_lists, weights):
+        if not res:
+            continue
+        scores = np.fromiter((r["score"] for r in res), dtype=np.float64, count=len(res))
+        np.add.at(fused, idx, scores * w)
+
+    return firsts, fused
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """
+    Indices of the top_k highest scores, best first (ties keep input order).
+    O(U) argpartition + O(k log k) sort of the selected entries instead of a full sort.
+    """
+    k = min(top_k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < scores.size:
+        cand = np.sort(np.argpartition(-scores, k - 1)[:k])
+    else:
+        cand = np.arange(scores.size)
+    return cand[np.argsort(-scores[cand], kind="stable")]
+
+
+def ensemble_z_scores(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    weights: Sequence[float],
+    top_k: int
+) -> List[Dict[str, Any]]:
+    """
+    Z-score ensemble of several result lists.
+    Returns copies of the first-seen result dicts with the fused score min-max scaled to [0, 1].
+    """
+    firsts, fused = fuse_z_scores(result_lists, weights)
+    if not firsts:
+        return []
+
+    order = top_k_indices(fused, top_k)
+    top = fused[order]
+    mn, mx = top.min(), top.max()
+    final_scores = ((top - mn) / (mx - mn)).tolist() if mx > mn else [1.0] * len(order)
+
+    results = []
+    for i, s in zip(order.tolist(), final_scores):
+        item = firsts[i].copy()
+        item["score"] = s
+        results.append(item)
+    return results
+
+
+def ensemble_weighted_sum(
+    result_lists: Sequence[List[Dict[str, Any]]],
+    weights: Sequence[float],
+    top_k: int
+) -> List[Dict[str, Any]]:
+    """
+    Weighted-sum ensemble of result lists whose scores are already scaled to [0, 1].
+    Returns copies of the first-seen result dicts with the combined score, best first.
+    """
+    firsts, fused = fuse_weighted(result_lists, weights)
+    order = top_k_indices(fused, top_k)
+
+    results = []
+    for i, s in zip(order.tolist(), fused[order].tolist()):
+        item = firsts[i].copy()
+        item["score"] = s
+        results.append(item)
+    return results
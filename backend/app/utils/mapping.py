@@ -1,10 +1,13 @@
-import json
+import mmap
 import os
-from typing import Optional, Dict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from functools import lru_cache
 from pathlib import Path
 import re
 
+import numpy as np
+import orjson
+
 try:
     from app.core.config import settings
 except ModuleNotFoundError:
@@ -14,34 +17,117 @@ except ModuleNotFoundError:
     from app.core.config import settings
 
 
-@lru_cache(maxsize=1)
-def load_mapping_kf() -> Dict[str, str]:
-    mapping_path = settings.MAPPING_KF_PATH
-
-    if not os.path.isabs(mapping_path):
-        base = Path(__file__).resolve().parents[2]
-        mapping_path = base / mapping_path
-
+def _read_json(path: Path) -> Dict[str, str]:
     try:
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Parse straight from the page cache (no read() copy of a multi-MB file)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as buf:
+                return orjson.loads(buf)
     except Exception:
         return {}
 
 
+@lru_cache(maxsize=1)
+def load_mapping_kf() -> Dict[str, str]:
+    return _read_json(_resolve(settings.MAPPING_KF_PATH))
+
+
 @lru_cache(maxsize=1)
 def load_mapping_scene() -> Dict[str, str]:
-    mapping_path = settings.MAPPING_SCENE_PATH
+    return _read_json(_resolve(settings.MAPPING_SCENE_PATH))
 
-    if not os.path.isabs(mapping_path):
-        base = Path(__file__).resolve().parents[2]
-        mapping_path = base / mapping_path
 
+# Compact mapping cache (build_mapping_cache): sorted (id, offset, length) records
+# in <mapping>.idx + all frontend paths (/keyframe/...) as UTF-8 in <mapping>.paths, both memory-mapped
+_IDX_DTYPE = np.dtype([("id", "<u4"), ("off", "<u4"), ("len", "<u2")])
+
+
+class CompactMapping:
+    """Read-only id -> path lookup over the memory-mapped files written by build_mapping_cache"""
+
+    def __init__(self, idx_path: Path, paths_path: Path):
+        self._idx = np.memmap(idx_path, dtype=_IDX_DTYPE, mode="r")
+        self._ids = np.ascontiguousarray(self._idx["id"])  # 4 bytes/entry, binary-searched
+        self._paths = np.memmap(paths_path, dtype=np.uint8, mode="r")
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        if not key.isdigit() or (len(key) > 1 and key[0] == "0"):
+            return default
+        k = int(key)
+        i = int(np.searchsorted(self._ids, k))
+        if i >= len(self._ids) or self._ids[i] != k:
+            return default
+        off = int(self._idx["off"][i])
+        return bytes(self._paths[off:off + int(self._idx["len"][i])]).decode("utf-8")
+
+
+def _resolve(mapping_path: str) -> Path:
+    path = Path(mapping_path)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parents[2] / path
+    return path
+
+
+def _cache_files(json_path: Path) -> Tuple[Path, Path]:
+    return json_path.with_suffix(".idx"), json_path.with_suffix(".paths")
+
+
+def build_mapping_cache(mapping_path: str) -> int:
+    """
+    Write the compact cache next to a JSON mapping (numeric ids only),
+    paths stored already normalized. Returns the number of entries.
+    """
+    json_path = _resolve(mapping_path)
+    with open(json_path, "rb") as f:
+        mapping = orjson.loads(f.read())
+    return _write_mapping_cache(json_path, mapping)
+
+
+def _write_mapping_cache(json_path: Path, mapping: Dict[str, str]) -> int:
+    entries = sorted((int(k), _frontend_path(v).encode("utf-8")) for k, v in mapping.items())
+    idx = np.empty(len(entries), dtype=_IDX_DTYPE)
+    blob = bytearray()
+    for i, (k, path) in enumerate(entries):
+        idx[i] = (k, len(blob), len(path))
+        blob += path
+    if len(blob) >= 2 ** 32:
+        raise ValueError(f"{json_path} paths exceed 4GB, too large for the compact cache")
+
+    idx_path, paths_path = _cache_files(json_path)
+    idx.tofile(idx_path)
+    paths_path.write_bytes(bytes(blob))
+    return len(entries)
+
+
+def _load_lookup(mapping_path: str):
+    """
+    id -> frontend path: CompactMapping if an up-to-date cache exists, else a dict
+    built from the JSON with every path normalized once at load
+    """
+    json_path = _resolve(mapping_path)
+    idx_path, paths_path = _cache_files(json_path)
     try:
-        with open(mapping_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        if idx_path.exists() and paths_path.exists() and (
+            not json_path.exists() or idx_path.stat().st_mtime >= json_path.stat().st_mtime
+        ):
+            return CompactMapping(idx_path, paths_path)
     except Exception:
-        return {}
+        pass
+    return {k: _frontend_path(v) for k, v in _read_json(json_path).items()}
+
+
+@lru_cache(maxsize=1)
+def load_lookup_kf():
+    """Keyframe id -> path lookup for search results (memory-mapped cache or JSON dict)"""
+    return _load_lookup(settings.MAPPING_KF_PATH)
+
+
+@lru_cache(maxsize=1)
+def load_lookup_scene():
+    return _load_lookup(settings.MAPPING_SCENE_PATH)
 
 
 def _normalize_keyframe_path(path: str) -> str:
@@ -66,26 +152,33 @@ def _normalize_keyframe_path(path: str) -> str:
     return path
 
 
+def _frontend_path(path: str) -> str:
+    return f"/keyframe/{_normalize_keyframe_path(path)}"
+
+
 def get_keyframe_path(result_id: str) -> Optional[str]:
-    mapping = load_mapping_kf()
-    rid = str(result_id)
+    return _keyframe_path(str(result_id))
+
 
-    if rid not in mapping:
-        return None
+def get_keyframe_paths(result_ids: Iterable[Any]) -> List[Optional[str]]:
+    """get_keyframe_path for a whole result list (one call instead of one per result)"""
+    kf_path = _keyframe_path
+    return [kf_path(str(rid)) for rid in result_ids]
 
-    normalized = _normalize_keyframe_path(mapping[rid])
-    return f"/keyframe/{normalized}"
+
+@lru_cache(maxsize=65536)
+def _keyframe_path(rid: str) -> Optional[str]:
+    # Paths are normalized at load; memoized so hot ids also skip the memmap binary search
+    return load_lookup_kf().get(rid)
 
 
 def get_scene_keyframe_path(scene_id: str) -> Optional[str]:
-    mapping = load_mapping_scene()
-    sid = str(scene_id)
+    return _scene_keyframe_path(str(scene_id))
 
-    if sid not in mapping:
-        return None
 
-    normalized = _normalize_keyframe_path(mapping[sid])
-    return f"/keyframe/{normalized}"
+@lru_cache(maxsize=65536)
+def _scene_keyframe_path(sid: str) -> Optional[str]:
+    return load_lookup_scene().get(sid)
 
 
 def _natural_key(s: str):
@@ -103,7 +196,9 @@ def rebuild_mapping_kf(
 
     root = Path(keyframe_dir)
     if not root.is_absolute():
-        root = (base / root).resolve()
+        root = base / root
+    # Resolved once here instead of once per file below
+    root = root.resolve()
 
     out_path = Path(output_path)
     if not out_path.is_absolute():
@@ -111,18 +206,35 @@ def rebuild_mapping_kf(
 
     if not root.exists():
         return 0
-
-    files = [str(p).replace("\\", "/") for p in root.rglob("*.webp")]
-    files.sort(key=_natural_key)
+    root.relative_to(base)  # paths are stored relative to base: ValueError if the tree is outside it
+
+    # os.walk yields plain strings (no Path object per file); the sort key is computed once per file
+    files = [
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(root)
+        for name in names
+        if name.endswith(".webp")
+    ]
+    files.sort(key=lambda full: _natural_key(full.replace("\\", "/")))
 
     mapping = {}
     for idx, full in enumerate(files):
-        rel = str(Path(full).resolve().relative_to(base)).replace("\\", "/")
-        mapping[str(idx)] = rel
+        mapping[str(idx)] = os.path.relpath(full, base).replace("\\", "/")
 
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(mapping, f, ensure_ascii=False, indent=2)
+    with open(out_path, "wb") as f:
+        f.write(orjson.dumps(mapping, option=orjson.OPT_INDENT_2))
+
+    # The JSON is the readable export; lookups load the memory-mapped cache
+    _write_mapping_cache(out_path, mapping)
 
     load_mapping_kf.cache_clear()
+    load_lookup_kf.cache_clear()
+    _keyframe_path.cache_clear()
     return len(mapping)
+
+
+if __name__ == "__main__":
+    # One-time: bake the compact caches next to the JSON mappings
+    for path in (settings.MAPPING_KF_PATH, settings.MAPPING_SCENE_PATH):
+        print(f"{path}: {build_mapping_cache(path)} entries")
@@ -1,30 +1,28 @@
 import numpy as np
-from typing import List
+from typing import Any, Callable, Dict, List, Sequence, Union
+
+Scores = Union[Sequence[float], np.ndarray]
 
 
 class ScoreScaler:
     @staticmethod
-    def z_score_normalize(scores: List[float]) -> List[float]:
-        if not scores:
+    def z_score_normalize(scores: Scores) -> List[float]:
+        if len(scores) == 0:
             return []
 
-        arr = np.array(scores, dtype=np.float32)
-        mean = arr.mean()
+        arr = np.asarray(scores, dtype=np.float32)
         std = arr.std()
-
-        if std == 0:
-            return [0.0] * len(scores)
-
-        return ((arr - mean) / std).tolist()
+        # Constant scores -> (arr - mean) is all zeros, dividing by 1 keeps them 0
+        return ((arr - arr.mean()) / (std if std > 0 else 1.0)).tolist()
 
 
     @staticmethod
-    def bm25_scale(scores: List[float]) -> List[float]:
+    def bm25_scale(scores: Scores) -> List[float]:
 
-        if not scores:
+        if len(scores) == 0:
             return []
 
-        arr = np.array(scores, dtype=np.float32)
+        arr = np.asarray(scores, dtype=np.float32)
         mean = arr.mean()
         std = arr.std()
 
@@ -35,11 +33,11 @@ class ScoreScaler:
         return (1 / (1 + np.exp(-z))).tolist()
 
     @staticmethod
-    def min_max_scale(scores: List[float]) -> List[float]:
-        if not scores:
+    def min_max_scale(scores: Scores) -> List[float]:
+        if len(scores) == 0:
             return []
 
-        arr = np.array(scores, dtype=np.float32)
+        arr = np.asarray(scores, dtype=np.float32)
         mn = arr.min()
         mx = arr.max()
 
@@ -47,3 +45,18 @@ class ScoreScaler:
             return [1.0] * len(scores)
 
         return ((arr - mn) / (mx - mn)).tolist()
+
+    @staticmethod
+    def scale_results(
+        results: List[Dict[str, Any]],
+        scale: Callable[[Scores], List[float]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Replace every result's "score" with its scaled value, in place (returns results).
+        Scores go straight into a float32 array, no intermediate Python list.
+        """
+        if results:
+            raw = np.fromiter((r["score"] for r in results), dtype=np.float32, count=len(results))
+            for r, scaled in zip(results, scale(raw)):
+                r["score"] = scaled
+        return results
@@ -0,0 +1,71 @@
+import threading
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """
+    Near-duplicate query cache: a value is stored under its (unit-normalised) query
+    embedding and returned for any later query whose cosine similarity to it is
+    >= threshold. Entries expire after ttl seconds; when full, the least recently
+    used entry is replaced. Lookup is one (maxsize, dim) @ (dim,) product.
+
+    tag separates entries that must never be mixed (e.g. different top_k).
+    """
+
+    def __init__(self, maxsize: int, threshold: float, ttl: float):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._embs: Optional[np.ndarray] = None  # (maxsize, dim), allocated on first put
+        self._values: List[Any] = [None] * maxsize
+        self._tags = np.zeros(maxsize, dtype=np.int64)
+        self._expires = np.zeros(maxsize, dtype=np.float64)  # monotonic deadline, 0 = empty slot
+        self._used = np.zeros(maxsize, dtype=np.float64)  # last access time (LRU)
+
+    @staticmethod
+    def _normalize(emb: np.ndarray) -> Optional[np.ndarray]:
+        q = np.asarray(emb, dtype=np.float32).ravel()
+        norm = np.linalg.norm(q)
+        return q / norm if norm > 0 else None
+
+    def get(self, emb: np.ndarray, tag: int = 0) -> Optional[Any]:
+        q = self._normalize(emb)
+        if q is None:
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            if self._embs is None or self._embs.shape[1] != q.shape[0]:
+                return None
+            valid = (self._expires > now) & (self._tags == tag)
+            if not valid.any():
+                return None
+            sims = self._embs @ q
+            sims[~valid] = -np.inf
+            i = int(np.argmax(sims))
+            if sims[i] < self.threshold:
+                return None
+            self._used[i] = now
+            return self._values[i]
+
+    def put(self, emb: np.ndarray, value: Any, tag: int = 0) -> None:
+        q = self._normalize(emb)
+        if q is None:
+            return
+
+        now = time.monotonic()
+        with self._lock:
+            if self._embs is None or self._embs.shape[1] != q.shape[0]:
+                self._embs = np.zeros((self.maxsize, q.shape[0]), dtype=np.float32)
+                self._expires[:] = 0
+            free = np.flatnonzero(self._expires <= now)
+            i = int(free[0]) if free.size else int(np.argmin(self._used))
+            self._embs[i] = q
+            self._values[i] = value
+            self._tags[i] = tag
+            self._expires[i] = now + self.ttl
+            self._used[i] = now
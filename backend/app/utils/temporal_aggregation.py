@@ -6,7 +6,9 @@ Supports two temporal modes:
 2. ID mode: Aggregate by media id, sum scores across stages
 """
 
+import heapq
 import logging
+from operator import itemgetter
 from typing import List, Dict, Any, Tuple, Optional
 from collections import defaultdict
 from itertools import product
@@ -226,9 +228,9 @@ def find_temporal_tuples(stage_results: List[List[Dict[str, Any]]], max_tuples:
         if len(tuples) >= max_tuples * 10:
             break
     
-    # Sort by total score and take top max_tuples
-    tuples.sort(key=lambda x: x["total_score"], reverse=True)
-    tuples = tuples[:max_tuples]
+    # Top max_tuples by total score: O(n log k) heap selection instead of sorting up to 10x max_tuples
+    # (same order as a stable descending sort)
+    tuples = heapq.nlargest(max_tuples, tuples, key=itemgetter("total_score"))
     
     logger.info(f"[TEMPORAL_AGG] Found {len(tuples)} valid tuples")
     return tuples
@@ -1,5 +1,6 @@
 import re
 import logging
+import threading
 from deep_translator import GoogleTranslator
 
 logger = logging.getLogger(__name__)
@@ -37,11 +38,14 @@ class VietnameseTranslator:
 
 
 _translator_instance = None
+_translator_lock = threading.Lock()
 
 
 def get_translator() -> VietnameseTranslator:
     """Get singleton translator instance"""
     global _translator_instance
     if _translator_instance is None:
-        _translator_instance = VietnameseTranslator()
+        with _translator_lock:
+            if _translator_instance is None:
+                _translator_instance = VietnameseTranslator()
     return _translator_instance
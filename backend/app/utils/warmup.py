@@ -0,0 +1,52 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+WARMUP_QUERY = "a person walking on the street"
+
+
+def warmup_search_services(top_k: int = 10) -> None:
+    """
+    Warm up search services before serving the first request:
+    load keyframe/scene mappings, build the singletons, and run one
+    query through every embedding server + Qdrant collection + ES index.
+
+    Cohere rerank is skipped on purpose (it is billed per call).
+    Every step is best-effort: a failing service only logs a warning.
+    """
+    t0 = time.time()
+
+    try:
+        from app.utils.mapping import load_lookup_kf, load_lookup_scene
+        load_lookup_kf()
+        load_lookup_scene()
+    except Exception as e:
+        logger.warning(f"[WARMUP] Mapping load failed: {e}")
+
+    try:
+        from app.services.method.multimodel_search import get_multimodel_search
+        multimodel_search = get_multimodel_search()
+        for model in ("clip", "beit3", "bigg"):
+            multimodel_search.search_single_model(WARMUP_QUERY, model, top_k)
+    except Exception as e:
+        logger.warning(f"[WARMUP] Multimodal warmup failed: {e}")
+
+    try:
+        from app.services.method.ic_search import get_ic_search
+        ic = get_ic_search()
+        emb = ic.qwen.extract_text_embedding(WARMUP_QUERY)
+        if emb is not None and emb.size > 0:
+            ic.qdrant.search(collection_name=ic.collection, query_vector=emb[0], top_k=top_k)
+    except Exception as e:
+        logger.warning(f"[WARMUP] IC warmup failed: {e}")
+
+    try:
+        from app.services.method.asr_ocr import get_asr_ocr_search
+        asr_ocr = get_asr_ocr_search()
+        asr_ocr.search_asr(WARMUP_QUERY, top_k)
+        asr_ocr.search_ocr(WARMUP_QUERY, top_k)
+    except Exception as e:
+        logger.warning(f"[WARMUP] ASR/OCR warmup failed: {e}")
+
+    logger.info(f"🔥 Search services warmed up in {time.time() - t0:.2f}s")